@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Multi-Pico gateway
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Collects readings from Picos on a network without a route to the
+collector (e.g. an isolated lab Wi-Fi) and forwards them in bulk.
+
+One asyncio process polls every device's /api/status concurrently
+(MAX_CONCURRENCY requests in flight, DEVICE_TIMEOUT per request, one
+shared connection pool), each device on its own POLL_INTERVAL schedule
+with a random phase. Unreachable devices are polled less often, up to
+every MAX_DEVICE_BACKOFF seconds, so dead devices do not hold up the rest.
+
+Readings are posted to the collector's submit-sensor-data as JSON arrays
+of up to BATCH_SIZE samples. While the collector is unreachable or asks
+to wait (429/503), full batches are written to SPOOL_DIR and sent again,
+oldest first, once it answers. The collector ignores samples it already
+has, so a batch can safely be sent twice.
+
+Usage:
+    python3 labmonitor_gateway.py [--config gateway.cfg]
+                                  [--devices 10.0.0.11,10.0.0.12]
+                                  [--discover 10.0.0.0/24] [--once]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import ipaddress
+import collections
+import configparser
+import aiohttp
+
+MAX_SUBMIT_SAMPLES = 1000       # collector limit per request
+DISCOVER_TIMEOUT = 2.0          # seconds per probed address
+MIN_VALID_UTC_NS = 1_577_836_800 * 1_000_000_000   # 2020-01-01, as in the collector's libCollector.py
+
+def load_config(path):
+    """Reads gateway.cfg (plain KEY=value lines, no section header)."""
+    config = configparser.ConfigParser(allow_no_value=True)
+    with open(path, 'r') as f:
+        config.read_string(f'[DEFAULT]\n{f.read()}')
+    return config['DEFAULT']
+
+def filter_cpu_readings(sample):
+    """Nulls readings taken from a CPU-temperature fallback, as the Pico
+    does before it submits (/api/status returns them unfiltered)."""
+    for i in (1, 2, 3):
+        t = sample.get(f"sens{i}_type")
+        if isinstance(t, str) and t.strip().upper().startswith("CPU"):
+            for suffix in ("Temp", "RH", "P", "HI"):
+                sample[f"sens{i}_{suffix}"] = None
+    return sample
+
+class Spool:
+    """Batches not yet accepted by the collector, one JSON file each,
+    written atomically. The oldest are dropped beyond max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def files(self):
+        return sorted(f for f in os.listdir(self.dir) if f.endswith(".json") and not f.startswith("."))
+
+    def put(self, samples):
+        name = f"{time.time_ns():020d}-{self._seq:06d}.json"
+        self._seq += 1
+        tmp = os.path.join(self.dir, "." + name)
+        with open(tmp, "w") as f:
+            json.dump(samples, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.dir, name))
+        self._trim()
+
+    def oldest(self):
+        """(path, samples) of the oldest spooled batch, or None."""
+        for name in self.files():
+            path = os.path.join(self.dir, name)
+            try:
+                with open(path) as f:
+                    return path, json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Unreadable spool file {name}, removing it: {e}")
+                self.remove(path)
+        return None
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _trim(self):
+        files = self.files()
+        sizes = {f: os.path.getsize(os.path.join(self.dir, f)) for f in files}
+        total = sum(sizes.values())
+        while files and total > self.max_bytes:
+            oldest = files.pop(0)
+            total -= sizes[oldest]
+            self.remove(os.path.join(self.dir, oldest))
+            print(f"[WARNING] Spool over {self.max_bytes // 2**20} MB: dropped {oldest}")
+
+class DeviceState:
+    def __init__(self, ip):
+        self.ip = ip
+        self.name = None
+        self.failures = 0
+        self.last_ok = None
+        self.last_error = None
+
+    def next_delay(self, interval, max_backoff):
+        if not self.failures:
+            return interval
+        return min(max(interval, max_backoff), interval * 2 ** (self.failures - 1))
+
+class Gateway:
+
+    def __init__(self, config):
+        self.collector_url = config.get('COLLECTOR_URL').rstrip('/') + '/submit-sensor-data'
+        self.key = config.get('SERVER_SECRET_KEY')
+        self.poll_interval = config.getfloat('POLL_INTERVAL', 30.0)
+        self.device_timeout = aiohttp.ClientTimeout(total=config.getfloat('DEVICE_TIMEOUT', 5.0))
+        self.collector_timeout = aiohttp.ClientTimeout(total=config.getfloat('COLLECTOR_TIMEOUT', 30.0))
+        self.max_backoff = config.getfloat('MAX_DEVICE_BACKOFF', 300.0)
+        self.max_concurrency = config.getint('MAX_CONCURRENCY', 100)
+        self.batch_size = min(config.getint('BATCH_SIZE', 500), MAX_SUBMIT_SAMPLES)
+        self.forward_interval = config.getfloat('FORWARD_INTERVAL', 5.0)
+        self.spool = Spool(config.get('SPOOL_DIR', '/var/lib/labmonitor-gateway/spool'),
+                           config.getint('SPOOL_MAX_MB', 500) * 2**20)
+        self.devices = {}           # ip -> DeviceState
+        self.buffer = []            # samples not yet posted
+        self.retry_at = 0.0         # no post to the collector before this (loop time)
+        self.collector_failures = 0
+        self.stats = collections.Counter()
+        self._tasks = {}
+        self._flush = asyncio.Event()
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+
+    # -- devices ----------------------------------------------------------
+    def add_devices(self, session, ips):
+        for ip in ips:
+            if ip not in self.devices:
+                self.devices[ip] = DeviceState(ip)
+                self._tasks[ip] = asyncio.ensure_future(self.poll_loop(session, ip))
+                print(f"[INFO] Polling {ip}")
+
+    async def poll_device(self, session, state):
+        """One /api/status request. Returns True on success."""
+        async with self._limit:
+            polled_ns = time.time_ns()
+            try:
+                # submitMongo=false: the Pico must not try to reach the collector itself
+                async with session.get(f"http://{state.ip}/api/status", params={"submitMongo": "false"},
+                                       timeout=self.device_timeout) as r:
+                    r.raise_for_status()
+                    sample = await r.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                state.failures += 1
+                state.last_error = str(e) or type(e).__name__
+                self.stats["poll_errors"] += 1
+                if state.failures in (1, 5) or state.failures % 20 == 0:
+                    print(f"[ERROR] {state.ip} ({state.name or 'unknown'}): poll failed {state.failures}x: {state.last_error}")
+                return False
+        if state.failures >= 5:
+            print(f"[INFO] {state.ip} ({sample.get('device_name')}) is back after {state.failures} failed polls")
+        state.failures = 0
+        state.last_ok = time.time()
+        state.name = sample.get("device_name")
+        self.add_sample(filter_cpu_readings(sample), state.ip, polled_ns)
+        return True
+
+    async def poll_loop(self, session, ip):
+        state = self.devices[ip]
+        loop = asyncio.get_running_loop()
+        # Random phase, so devices are not all polled on the same tick
+        await asyncio.sleep(random.random() * self.poll_interval)
+        while True:
+            t0 = loop.time()
+            await self.poll_device(session, state)
+            delay = state.next_delay(self.poll_interval, self.max_backoff)
+            await asyncio.sleep(max(0.0, delay - (loop.time() - t0)))
+
+    def add_sample(self, sample, ip, polled_ns):
+        # The gateway's key replaces whatever the Pico was configured with
+        sample["mongo_secret_key"] = self.key
+        # Picos without NTP send UTC=0. Stamp them with the poll time here:
+        # the collector would otherwise use the (possibly much later) time
+        # a spooled batch is replayed, and could not deduplicate them.
+        try:
+            utc = int(sample.get("UTC") or 0)
+        except (TypeError, ValueError):
+            utc = 0
+        if utc < MIN_VALID_UTC_NS:
+            sample["UTC"] = polled_ns
+        sample.setdefault("ip", ip)
+        self.buffer.append(sample)
+        self.stats["polled"] += 1
+        if len(self.buffer) >= self.batch_size:
+            self._flush.set()
+
+    async def discover(self, session, network):
+        """Addresses in network answering /api/acquisition_status like a Pico."""
+        async def probe(ip):
+            async with self._limit:
+                try:
+                    async with session.get(f"http://{ip}/api/acquisition_status",
+                                           timeout=aiohttp.ClientTimeout(total=DISCOVER_TIMEOUT)) as r:
+                        if r.status == 200 and "status" in await r.json(content_type=None):
+                            return str(ip)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    pass
+            return None
+        hosts = ipaddress.ip_network(network, strict=False).hosts()
+        found = [ip for ip in await asyncio.gather(*(probe(h) for h in hosts)) if ip]
+        print(f"[INFO] Discovery on {network}: {len(found)} device(s)")
+        return found
+
+    # -- collector --------------------------------------------------------
+    async def post(self, session, batch):
+        """Posts one batch. Returns True when the collector is done with it
+        (accepted, or refused for good), False to keep it for later."""
+        loop = asyncio.get_running_loop()
+        try:
+            async with session.post(self.collector_url, json=batch, timeout=self.collector_timeout) as r:
+                await r.read()
+                if r.status in (429, 503):
+                    try:
+                        wait = max(1, int(r.headers.get("Retry-After", "")))
+                    except ValueError:
+                        wait = 30
+                    self.retry_at = loop.time() + wait
+                    print(f"[WARNING] Collector answered {r.status}, retrying in {wait} s")
+                    return False
+                if r.status >= 500:
+                    raise aiohttp.ClientResponseError(r.request_info, (), status=r.status, message=r.reason)
+                self.collector_failures = 0
+                if r.status >= 400:
+                    print(f"[ERROR] Collector rejected {len(batch)} samples ({r.status}), dropping them")
+                    self.stats["rejected"] += len(batch)
+                else:
+                    self.stats["forwarded"] += len(batch)
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.collector_failures += 1
+            wait = min(60, 2 ** self.collector_failures)
+            self.retry_at = loop.time() + wait
+            print(f"[ERROR] Collector unreachable ({e or type(e).__name__}), retrying in {wait} s")
+            return False
+
+    async def forward(self, session):
+        loop = asyncio.get_running_loop()
+        while self.buffer:
+            if loop.time() < self.retry_at:
+                # Collector down: keep a partial batch in memory, spool full ones
+                while len(self.buffer) >= self.batch_size:
+                    self.spool.put(self.buffer[:self.batch_size])
+                    self.stats["spooled"] += self.batch_size
+                    del self.buffer[:self.batch_size]
+                return
+            batch = self.buffer[:self.batch_size]
+            del self.buffer[:self.batch_size]
+            if not await self.post(session, batch):
+                self.spool.put(batch)
+                self.stats["spooled"] += len(batch)
+        # Collector reachable: replay the spool, oldest first
+        while loop.time() >= self.retry_at:
+            entry = self.spool.oldest()
+            if entry is None:
+                break
+            path, batch = entry
+            if not await self.post(session, batch):
+                break
+            self.spool.remove(path)
+            self.stats["replayed"] += len(batch)
+
+    async def forward_loop(self, session):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush.wait(), self.forward_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush.clear()
+            await self.forward(session)
+
+    def shutdown(self):
+        """Keeps whatever was not posted for the next start."""
+        for task in self._tasks.values():
+            task.cancel()
+        if self.buffer:
+            self.spool.put(self.buffer)
+            print(f"[INFO] Spooled {len(self.buffer)} unsent samples")
+            self.buffer = []
+
+    def summary(self):
+        up = sum(1 for d in self.devices.values() if not d.failures and d.last_ok)
+        return (f"devices {up}/{len(self.devices)} up, {dict(self.stats)}, "
+                f"buffer {len(self.buffer)}, spool {len(self.spool.files())} file(s)")
+
+async def run(config, args):
+    gateway = Gateway(config)
+    devices = [d.strip() for d in (args.devices or config.get('DEVICES') or '').split(',') if d.strip()]
+    if config.get('DEVICES_FILE'):
+        with open(config.get('DEVICES_FILE')) as f:
+            devices += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    network = args.discover or config.get('DISCOVER')
+
+    # One pool for every device and the collector; idle connections are reused
+    connector = aiohttp.TCPConnector(limit=gateway.max_concurrency + 4, limit_per_host=2)
+    async with aiohttp.ClientSession(connector=connector, headers={"Accept": "application/json"}) as session:
+        if network:
+            devices += await gateway.discover(session, network)
+        if not devices:
+            print("[CRITICAL ERROR] No devices: set DEVICES, DEVICES_FILE or DISCOVER, or use --devices/--discover.")
+            return 1
+
+        if args.once:
+            for ip in dict.fromkeys(devices):
+                gateway.devices[ip] = DeviceState(ip)
+            await asyncio.gather(*(gateway.poll_device(session, d) for d in gateway.devices.values()))
+            await gateway.forward(session)
+            gateway.shutdown()
+            print(f"[INFO] {gateway.summary()}")
+            return 0
+
+        gateway.add_devices(session, dict.fromkeys(devices))
+        forwarder = asyncio.ensure_future(gateway.forward_loop(session))
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        rediscover_every = config.getfloat('DISCOVER_INTERVAL', 600.0)
+        next_discovery = loop.time() + rediscover_every
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 60)
+            except asyncio.TimeoutError:
+                pass
+            print(f"[INFO] {gateway.summary()}")
+            if network and loop.time() >= next_discovery:
+                gateway.add_devices(session, await gateway.discover(session, network))
+                next_discovery = loop.time() + rediscover_every
+
+        forwarder.cancel()
+        gateway.shutdown()
+    print(f"[INFO] Gateway stopped: {gateway.summary()}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll LabMonitor Picos and forward their readings to the collector.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "gateway.cfg"))
+    parser.add_argument("--devices", help="comma-separated device addresses (overrides DEVICES)")
+    parser.add_argument("--discover", help="network to scan for devices, e.g. 10.0.0.0/24 (overrides DISCOVER)")
+    parser.add_argument("--once", action="store_true", help="poll every device once, forward and exit")
+    args = parser.parse_args()
+    return asyncio.run(run(load_config(args.config), args))
+
+if __name__ == "__main__":
+    sys.exit(main())
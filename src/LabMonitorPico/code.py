@@ -1,11 +1,11 @@
 # **********************************************
 # * LabMonitor - Rasperry Pico W/2W
 # * Pico driven
-# * v2026.07.31.2
+# * v2026.10.19.7
 # * By: Nicola Ferralis <ferralis@mit.edu>
 # **********************************************
 
-version = "2026.07.31.2"
+version = "2026.10.19.7"
 
 import wifi
 import time
@@ -24,11 +24,87 @@ import adafruit_requests
 from adafruit_httpserver import Server, MIMETypes, Response, GET, POST, JSONResponse, FileResponse
 import adafruit_ntp
 
+# Optional MQTT transport (submit_transport = "mqtt"): adafruit_minimqtt from the bundle
+try:
+    import adafruit_minimqtt.adafruit_minimqtt as MQTT
+except ImportError:
+    MQTT = None
+
+# Drops sockets left over from a lost Wi-Fi link (bundled with adafruit_requests)
+try:
+    from adafruit_connection_manager import connection_manager_close_all
+except ImportError:
+    connection_manager_close_all = None
+
 from libSensors import SensorDevices, overclock
 
 is_acquisition_running = False
 last_acquisition_time = 0          # int nanoseconds (time.monotonic_ns)
 ACQUISITION_INTERVAL = 30.0        # seconds; converted to ns at compare time
+PENDING_MAX = 50                   # samples kept in RAM while the server is unreachable or asks to wait
+DEFAULT_RETRY_AFTER = 60           # seconds, when a 429/503 carries no usable Retry-After
+MQTT_KEEP_ALIVE = 60               # seconds; the broker drops the connection after 1.5x this without traffic
+MQTT_RETRY_SECONDS = 15            # wait after a failed MQTT connection
+# Not needed over MQTT: the broker authenticates the device and the topic names it
+MQTT_SKIP_FIELDS = ("mongo_url", "mongo_secret_key", "is_pico_submit_mongo", "device_name")
+WIFI_BOOT_ATTEMPTS = 5             # failed connections at boot before resetting
+WIFI_RETRY_MIN = 1                 # seconds before the next reconnection attempt, doubled on each failure
+WIFI_RETRY_MAX = 30                # longest wait between reconnection attempts
+WIFI_CONNECT_TIMEOUT = 10          # seconds per association attempt
+WIFI_RESET_AFTER = 900             # reset the board only if Wi-Fi stays down this long
+NTP_RESYNC_SECONDS = 3600          # between NTP queries; the clock runs on time.monotonic_ns() in between
+
+# Compact binary records (submit_transport = "binary"), decoded by libRecord.py
+# on the server: envelope (magic, format version, record count, then device
+# name, comment, versions and IP as length-prefixed UTF-8), then one 62-byte
+# record per sample: version, presence bitmap, UTC ns, sensor type codes and
+# sens1..3 Temp/RH/P/HI as float32.
+RECORD_VERSION = 1
+ENVELOPE_FORMAT = "<2sBH"
+RECORD_FORMAT = "<BHq3B12f"
+RECORD_CHANNELS = ("temperature", "RH", "pressure", "HI")
+SENSOR_TYPE_CODES = {"sensor": 1, "CPU raw": 2, "CPU adj": 3, "CPU adj.": 4}
+NAN = float("nan")
+
+############################
+# Startup profiler
+############################
+class StartupProfiler:
+    """Timeline of the boot phases, in ms of time.monotonic_ns(), which
+    starts when the board powers up or resets (before code.py is loaded)."""
+    def __init__(self):
+        self.last_ms = 0
+        self.phases = []            # (phase, ms since reset, ms since previous mark)
+        self.first = {}             # "response"/"sample" -> ms since reset
+
+    def mark(self, phase):
+        now_ms = time.monotonic_ns() // 1_000_000
+        self.phases.append((phase, now_ms, now_ms - self.last_ms))
+        print(f"[startup] {now_ms:7d} ms  (+{now_ms - self.last_ms:6d} ms)  {phase}")
+        self.last_ms = now_ms
+
+    def first_time(self, event):
+        """Marks the first response or the first sample; later calls do nothing."""
+        if event in self.first:
+            return
+        self.mark(f"first {event}")
+        self.first[event] = self.last_ms
+        print(f"Time to first {event}: {self.last_ms} ms")
+
+    def report(self):
+        print("\nStartup timeline:")
+        print("-" * 40)
+        for phase, at_ms, delta_ms in self.phases:
+            print(f"{at_ms:7d} ms  (+{delta_ms:6d} ms)  {phase}")
+        print("-" * 40)
+
+    def summary(self):
+        return {"phases_ms": {phase: at_ms for phase, at_ms, _ in self.phases},
+                "first_response_ms": self.first.get("response"),
+                "first_sample_ms": self.first.get("sample")}
+
+startup = StartupProfiler()
+startup.mark("imports")
 
 ############################
 # Initial WiFi/Safe Mode Check
@@ -59,11 +135,14 @@ if supervisor.runtime.safe_mode_reason is not None:
 #   byte 1            : user_comment length
 #   bytes 2..201      : user_comment (UTF-8, up to _COMMENT_MAX)
 #   bytes 202..205    : acquisition interval, seconds (little-endian float32)
+#   byte 206          : Wi-Fi channel of the last access point (0/0xFF=unknown)
+#   bytes 207..212    : BSSID of the last access point
 _COMMENT_LEN_ADDR  = 1
 _COMMENT_DATA_ADDR = 2
-_COMMENT_MAX       = 200   # keep _INTERVAL_ADDR + 4 < len(microcontroller.nvm)
+_COMMENT_MAX       = 200   # keep _WIFI_ADDR + 7 < len(microcontroller.nvm)
 _INTERVAL_ADDR     = _COMMENT_DATA_ADDR + _COMMENT_MAX   # 202
 _INTERVAL_MAX      = 86400.0
+_WIFI_ADDR         = _INTERVAL_ADDR + 4                  # 206
 
 def load_acq_state():
     try:
@@ -122,6 +201,23 @@ def save_interval(seconds):
     except Exception as e:
         print(f"Could not persist interval: {e}")
 
+def load_wifi_hint():
+    """(channel, bssid) of the last access point, or (0, None)."""
+    try:
+        channel = microcontroller.nvm[_WIFI_ADDR]
+        bssid = bytes(microcontroller.nvm[_WIFI_ADDR + 1:_WIFI_ADDR + 7])
+    except Exception:
+        return 0, None
+    if channel in (0, 0xFF) or bssid in (b"\x00" * 6, b"\xff" * 6):   # fresh flash / garbage
+        return 0, None
+    return channel, bssid
+
+def save_wifi_hint(channel, bssid):
+    try:
+        microcontroller.nvm[_WIFI_ADDR:_WIFI_ADDR + 7] = bytes([channel]) + bssid
+    except Exception as e:
+        print(f"Could not persist Wi-Fi access point: {e}")
+
 ############################
 # User variable definitions
 ############################
@@ -166,12 +262,28 @@ class Conf:
 # Server
 ############################
 class LabServer:
-    def __init__(self, sensors):
-        self.sensors = sensors
+    def __init__(self, conf):
+        self.conf = conf
+        self.sensors = None         # initialized once the HTTP server is up (setup_sensors)
         self.ntp = None
         self.server = None
         self.ip = "0.0.0.0"
         self.user_comment = load_user_comment()
+        self.pending = []           # samples not yet accepted by the server, oldest first
+        self.retry_at_ns = 0        # no submission before this time (time.monotonic_ns)
+        self.mqtt = None            # persistent MQTT client (submit_transport = "mqtt")
+        self.mqtt_connected = False
+        self.mqtt_last_ns = 0       # last packet sent to the broker, for keep-alive pings
+        self.wifi_channel, self.wifi_bssid = load_wifi_hint()
+        self.wifi_lost_ns = 0       # when the link dropped (0: connected)
+        self.wifi_retry_ns = 0      # next reconnection attempt
+        self.wifi_backoff = WIFI_RETRY_MIN
+        self.utc_offset_ns = None   # NTP time minus time.monotonic_ns(), from the last sync
+        self.ssl_context = None
+        self.requests = None
+        # Started from serve_forever, one per loop pass, once the HTTP
+        # server is already answering
+        self.deferred = [self.setup_sensors, self.setup_tls, self.setup_ntp]
         
         # Initialize timing for the data loop and restore persisted state
         global last_acquisition_time, is_acquisition_running, ACQUISITION_INTERVAL
@@ -192,11 +304,18 @@ class LabServer:
             self.device_name = None
             self.cert_path = None
             self.is_pico_submit_mongo = "False"
+
+        self.submit_transport = (os.getenv("submit_transport") or "http").lower()
+        self.mqtt_broker = os.getenv("mqtt_broker")
+        self.mqtt_port = int(os.getenv("mqtt_port") or 8883)
+        self.mqtt_username = os.getenv("mqtt_username")
+        self.mqtt_password = os.getenv("mqtt_password")
             
         try:
             self.connect_wifi()
+            startup.mark("wifi")
             self.setup_server()
-            self.setup_ntp()
+            startup.mark("http server")
             print("\nDevice IP:", self.ip, "\nListening...")
         except RuntimeError as err:
             print(f"Initialization error: {err}")
@@ -211,56 +330,129 @@ class LabServer:
         self.reboot()
 
     def connect_wifi(self):
-        ssid = os.getenv('CIRCUITPY_WIFI_SSID')
-        password = os.getenv('CIRCUITPY_WIFI_PASSWORD')
-        if ssid is None or password is None:
+        if os.getenv('CIRCUITPY_WIFI_SSID') is None or os.getenv('CIRCUITPY_WIFI_PASSWORD') is None:
             raise RuntimeError("WiFi credentials not found.")
 
-        MAX_WIFI_ATTEMPTS = 5
-        attempt_count = 0
-        time.sleep(5)
-        while not wifi.radio.connected:
-            if attempt_count >= MAX_WIFI_ATTEMPTS:
-                raise RuntimeError("Failed to connect to WiFi after multiple attempts.")
-            print(f"\nConnecting to WiFi (attempt {attempt_count + 1}/{MAX_WIFI_ATTEMPTS})...")
+        # connect() returns once associated, so no settling delays: only a
+        # doubling wait after a failed attempt
+        delay = WIFI_RETRY_MIN
+        for attempt in range(1, WIFI_BOOT_ATTEMPTS + 1):
+            print(f"\nConnecting to WiFi (attempt {attempt}/{WIFI_BOOT_ATTEMPTS})...")
+            if self.associate_wifi():
+                print("WiFi Connected!")
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, WIFI_RETRY_MAX)
+        raise RuntimeError("Failed to connect to WiFi after multiple attempts.")
+
+    def associate_wifi(self):
+        """One connection attempt: first to the last known access point
+        (channel and BSSID given, so no full scan), then to any access point
+        with the SSID in case it moved. Returns True when connected."""
+        ssid = os.getenv('CIRCUITPY_WIFI_SSID')
+        password = os.getenv('CIRCUITPY_WIFI_PASSWORD')
+        hints = [{}]
+        if self.wifi_channel:
+            hints.insert(0, {"channel": self.wifi_channel, "bssid": self.wifi_bssid})
+        for hint in hints:
+            if wifi.radio.connected:
+                break
             try:
-                wifi.radio.connect(ssid, password)
-                time.sleep(2)
+                wifi.radio.connect(ssid, password, timeout=WIFI_CONNECT_TIMEOUT, **hint)
             except ConnectionError as e:
-                print(f"WiFi Connection Error: {e}")
-                time.sleep(5)
+                print(f"WiFi Connection Error{' (last access point)' if hint else ''}: {e}")
             except Exception as e:
                 print(f"WiFi other connect error: {e}")
-                time.sleep(3)
-            attempt_count += 1
+        if not wifi.radio.connected:
+            return False
+        self.ip = str(wifi.radio.ipv4_address)
+        self.remember_access_point()
+        return True
 
-        if wifi.radio.connected:
-            self.ip = str(wifi.radio.ipv4_address)
-            print("WiFi Connected!")
-        else:
-            raise RuntimeError("Failed to connect to WiFi.")
+    def remember_access_point(self):
+        """Stores the current channel and BSSID in NVM when they changed."""
+        try:
+            ap = wifi.radio.ap_info
+            channel, bssid = ap.channel, bytes(ap.bssid)
+        except Exception:
+            return
+        if (channel, bssid) != (self.wifi_channel, self.wifi_bssid):
+            self.wifi_channel, self.wifi_bssid = channel, bssid
+            save_wifi_hint(channel, bssid)
+
+    def check_wifi(self):
+        """Reconnects in place when the link drops, retrying with a doubling
+        delay up to WIFI_RETRY_MAX. Acquisition goes on meanwhile and samples
+        wait in self.pending; only an outage longer than WIFI_RESET_AFTER
+        resets the board. Returns True when connected."""
+        if wifi.radio.connected and not self.wifi_lost_ns:
+            return True
+        now = time.monotonic_ns()
+        if not self.wifi_lost_ns:
+            print("WiFi connection lost. Reconnecting...")
+            self.wifi_lost_ns = now
+            self.wifi_retry_ns = now
+            self.wifi_backoff = WIFI_RETRY_MIN
+            if self.mqtt_connected:
+                self.closeMqtt()
+        if now - self.wifi_lost_ns > WIFI_RESET_AFTER * 1_000_000_000:
+            print(f"WiFi down for more than {WIFI_RESET_AFTER}s. Rebooting...")
+            self.reboot()
+        if now < self.wifi_retry_ns and not wifi.radio.connected:
+            return False
+        if not self.associate_wifi():
+            print(f"WiFi reconnection failed, next attempt in {self.wifi_backoff}s")
+            self.wifi_retry_ns = time.monotonic_ns() + self.wifi_backoff * 1_000_000_000
+            self.wifi_backoff = min(self.wifi_backoff * 2, WIFI_RETRY_MAX)
+            return False
+        print(f"WiFi reconnected after {(time.monotonic_ns() - self.wifi_lost_ns) // 1_000_000} ms, IP: {self.ip}")
+        self.wifi_lost_ns = 0
+        self.restore_network()
+        return True
+
+    def restore_network(self):
+        """After a reconnection: drops sockets of the old link, rebinds the
+        HTTP server (the address may have changed) and sends what is pending
+        right away rather than at the next acquisition."""
+        if connection_manager_close_all is not None:
+            try:
+                connection_manager_close_all(self.pool)
+            except Exception as e:
+                print(f"Could not close stale sockets: {e}")
+        try:
+            self.server.stop()
+        except Exception:
+            pass
+        try:
+            self.server.start(host=self.ip, port=80)
+        except Exception as e:
+            print(f"Could not restart the HTTP server: {e}")
+        if self.pending and self.is_pico_submit_mongo.lower() == 'true':
+            print(f"\nSubmitting {len(self.pending)} pending sample(s)")
+            self.sendPending()
 
     def setup_server(self):
         pool = socketpool.SocketPool(wifi.radio)
+        self.pool = pool
         self.server = Server(pool, debug=True)
-        
-        ### Submission from Pico with certificate handling
-        ssl_context = ssl.create_default_context()
-        ROOT_CA_CERT = self.readCert(self.cert_path)
-        try:
-            ssl_context.load_verify_locations(cadata=ROOT_CA_CERT)
-            print("Custom Root CA successfully loaded.")
-        except Exception as e:
-            print(f"Failed to load certificate: {e}")
-        self.requests = adafruit_requests.Session(pool, ssl_context)
+
+        def route(*args, **kwargs):
+            """self.server.route, also recording the first response since boot."""
+            def register(handler):
+                def timed(request, *args, **kwargs):
+                    response = handler(request, *args, **kwargs)
+                    startup.first_time("response")
+                    return response
+                return self.server.route(*args, **kwargs)(timed)
+            return register
 
         # --- Routes ---
 
-        @self.server.route("/")
+        @route("/")
         def base_route(request):
             return self._serve_static_file(request, 'static/index.html')
 
-        @self.server.route("/api/control", methods=[POST])
+        @route("/api/control", methods=[POST])
         def api_control(request):
             global is_acquisition_running, last_acquisition_time, ACQUISITION_INTERVAL
             
@@ -303,15 +495,17 @@ class LabServer:
                 print(f"Error in /api/control: {e}")
                 return JSONResponse(request, {"success": False, "message": f"Server error: {e}"}, status=500)
 
-        @self.server.route("/api/acquisition_status", methods=[GET])
+        @route("/api/acquisition_status", methods=[GET])
         def api_acquisition_status(request):
-            status_data = {"status": self.get_acquisition_status(), "interval": ACQUISITION_INTERVAL, "user_comment": self.user_comment}
+            status_data = {"status": self.get_acquisition_status(), "interval": ACQUISITION_INTERVAL, "user_comment": self.user_comment,
+                           "startup": startup.summary()}
             print(f"status: {status_data['status']}")
             return JSONResponse(request, status_data)
 
-        @self.server.route("/api/status", methods=[GET])
+        @route("/api/status", methods=[GET])
         def api_status(request):
-            data_dict = self.assembleJson()
+            readings = self.readSensors()
+            data_dict = self.assembleJson(readings)
             
             print("\nSensor collected data:")
             print("-" * 40)
@@ -324,37 +518,36 @@ class LabServer:
                                 
             if submitMongo.lower() == 'true' and self.is_pico_submit_mongo.lower() == 'true':
                 print("\nSubmitting data to MongoDB")
-                url = self.mongo_url+"/LabMonitorDB/api/submit-sensor-data"
-                self.sendDataMongo(url, data_dict)
+                self.submitMongo(readings)
 
             headers = {"Content-Type": "application/json"}
             return Response(request, json.dumps(data_dict), headers=headers)
 
-        @self.server.route("/scripts.js")
+        @route("/scripts.js")
         def icon_route(request):
             return self._serve_static_file(request, 'static/scripts.js')
             
-        @self.server.route("/simple.html")
+        @route("/simple.html")
         def base_route(request):
             return self._serve_static_file(request, 'static/simple.html')
             
-        @self.server.route("/simple.js")
+        @route("/simple.js")
         def icon_route(request):
             return self._serve_static_file(request, 'static/simple.js')
 
-        @self.server.route("/manifest.json")
+        @route("/manifest.json")
         def icon_route(request):
             return self._serve_static_file(request, 'static/manifest.json')
 
-        @self.server.route("/favicon.ico")
+        @route("/favicon.ico")
         def favicon_route(request):
             return self._serve_static_file(request, 'static/favicon.ico', content_type="image/x-icon")
 
-        @self.server.route("/icon192.png")
+        @route("/icon192.png")
         def icon_route(request):
             return self._serve_static_file(request, 'static/icon192.png', content_type="image/png")
 
-        @self.server.route("/icon.png")
+        @route("/icon.png")
         def icon_route(request):
             return self._serve_static_file(request, 'static/icon.png', content_type="image/png")
 
@@ -376,38 +569,58 @@ class LabServer:
         global is_acquisition_running, last_acquisition_time
         
         while True:
-            if not wifi.radio.connected:
-                print("WiFi connection lost. Rebooting...")
-                self.reboot()
+            online = self.check_wifi()
 
-            try:
-                self.server.poll() 
-            except (BrokenPipeError, OSError) as e:
-                if isinstance(e, OSError) and e.args[0] not in (32, 104):
-                    print(f"Unexpected OSError in server poll: {e}")
-                elif isinstance(e, BrokenPipeError):
-                    pass
-            except Exception as e:
-                print(f"Unexpected critical error in server poll: {e}")
+            if online:
+                try:
+                    self.server.poll()
+                except (BrokenPipeError, OSError) as e:
+                    if isinstance(e, OSError) and e.args[0] not in (32, 104):
+                        print(f"Unexpected OSError in server poll: {e}")
+                    elif isinstance(e, BrokenPipeError):
+                        pass
+                except Exception as e:
+                    print(f"Unexpected critical error in server poll: {e}")
 
-            if is_acquisition_running:
+            if online and self.deferred:
+                self.run_deferred()
+
+            if is_acquisition_running and not self.deferred:
                 current_time = time.monotonic_ns()
                 interval_ns = int(ACQUISITION_INTERVAL * 1_000_000_000)
                 if (current_time - last_acquisition_time) >= interval_ns:
                     print(f"\nScheduled acquisition triggered at {current_time}")
                     print("-" * 40)
                     
-                    data_dict = self.assembleJson()
+                    readings = self.readSensors()
                     
                     if self.is_pico_submit_mongo.lower() == 'true':
                         print("\nSubmitting scheduled data to MongoDB")
-                        url = self.mongo_url + "/LabMonitorDB/api/submit-sensor-data"
-                        self.sendDataMongo(url, data_dict)
+                        self.submitMongo(readings)
                     
                     last_acquisition_time = current_time 
+                    startup.first_time("sample")
+
+            if online:
+                self.mqttKeepAlive()
 
             time.sleep(0.01)
             
+    def run_deferred(self):
+        """Runs the next deferred initialization step. When the last one is
+        done, the first acquisition is due right away instead of one
+        interval after boot."""
+        global last_acquisition_time
+        step = self.deferred.pop(0)
+        try:
+            step()
+        except Exception as e:
+            print(f"Deferred initialization {step.__name__} failed: {e}")
+        startup.mark(step.__name__)
+        if not self.deferred:
+            last_acquisition_time = time.monotonic_ns() - int(ACQUISITION_INTERVAL * 1_000_000_000)
+            startup.report()
+
     def get_acquisition_status(self):
         global is_acquisition_running
         return "running" if is_acquisition_running else "stopped"
@@ -425,12 +638,17 @@ class LabServer:
             print(f"Error opening or reading file at {file_path}: {e}")
             return None
             
-    def assembleJson(self):
+    def readSensors(self):
+        """One reading of the three sensors and the time: ((sensData1,
+        sensData2, sensData3), UTC)."""
+        self.setup_sensors()
         sensData1 = self.sensors.getData(self.sensors.envSensor1, self.sensors.envSensor1_name, self.sensors.sensor1_correct_temp)
         sensData2 = self.sensors.getData(self.sensors.envSensor2, self.sensors.envSensor2_name, self.sensors.sensor2_correct_temp)
         sensData3 = self.sensors.getData(self.sensors.envSensor3, self.sensors.envSensor3_name, self.sensors.sensor3_correct_temp)
+        return (sensData1, sensData2, sensData3), self.getUTC()
 
-        UTC = self.getUTC()
+    def assembleJson(self, readings=None):
+        (sensData1, sensData2, sensData3), UTC = readings or self.readSensors()
 
         data_dict = {
             "sens1_Temp": sensData1['temperature'],
@@ -463,18 +681,49 @@ class LabServer:
     ############################
     # Set up time/date
     ############################
+    def setup_sensors(self):
+        """Initializes the sensors (and takes the reading that calibrates the
+        CPU-temperature fallback). Runs after the HTTP server is listening,
+        or earlier on the first request that needs a reading."""
+        if self.sensors is None:
+            self.sensors = Sensors(self.conf)
+
+    def setup_tls(self):
+        """Submission from Pico with certificate handling."""
+        ssl_context = ssl.create_default_context()
+        ROOT_CA_CERT = self.readCert(self.cert_path)
+        try:
+            ssl_context.load_verify_locations(cadata=ROOT_CA_CERT)
+            print("Custom Root CA successfully loaded.")
+        except Exception as e:
+            print(f"Failed to load certificate: {e}")
+        self.ssl_context = ssl_context
+        self.requests = adafruit_requests.Session(self.pool, ssl_context)
+
     def setup_ntp(self):
+        """Creates the NTP client and syncs once, so the first sample does
+        not wait for it."""
         try:
-            self.ntp = adafruit_ntp.NTP(socketpool.SocketPool(wifi.radio), tz_offset=0)
+            self.ntp = adafruit_ntp.NTP(self.pool, tz_offset=0, cache_seconds=NTP_RESYNC_SECONDS)
         except Exception as e:
             print(f"Failed to setup NTP: {e}")
+            return
+        self.getUTC()
 
     def getUTC(self):
-        try:
-            return self.ntp.utc_ns
-        except Exception as e:
-            print(f"Error converting NTP time: {e}")
-            return 0
+        """NTP time. While NTP cannot be reached (e.g. Wi-Fi down), the last
+        NTP time carried forward by the monotonic clock, so samples queued
+        during an outage keep valid timestamps."""
+        if wifi.radio.connected and self.ntp is not None:
+            try:
+                utc = self.ntp.utc_ns
+                self.utc_offset_ns = utc - time.monotonic_ns()
+                return utc
+            except Exception as e:
+                print(f"Error converting NTP time: {e}")
+        if self.utc_offset_ns is not None:
+            return time.monotonic_ns() + self.utc_offset_ns
+        return 0
 
     def reboot(self):
         time.sleep(2)
@@ -497,14 +746,71 @@ class LabServer:
                 clean[f"sens{i}_HI"] = None
         return clean
 
+    def submitMongo(self, readings):
+        """Queues a sample (from readSensors) and sends everything pending,
+        unless the server asked us to wait (429/503 Retry-After). Samples are
+        kept in RAM, up to PENDING_MAX (oldest dropped first), until the
+        server accepts them; the server ignores samples it already has, so
+        resending is safe."""
+        if self.submit_transport == "binary":
+            self.pending.append((self.user_comment, self.packRecord(readings)))
+        else:
+            self.pending.append(self.filterCpuReadings(self.assembleJson(readings)))
+        if len(self.pending) > PENDING_MAX:
+            print(f"Pending queue full: dropping {len(self.pending) - PENDING_MAX} oldest sample(s)")
+            self.pending = self.pending[-PENDING_MAX:]
+        self.sendPending()
+
+    def sendPending(self):
+        """Sends the pending samples over the configured transport."""
+        if not wifi.radio.connected:
+            print(f"WiFi down: {len(self.pending)} sample(s) pending")
+            return
+        if self.requests is None:
+            print(f"Startup not complete: {len(self.pending)} sample(s) pending")
+            return
+
+        wait_ns = self.retry_at_ns - time.monotonic_ns()
+        if wait_ns > 0:
+            print(f"Server asked to wait: {len(self.pending)} sample(s) pending, next attempt in {wait_ns // 1_000_000_000}s")
+            return
+
+        if self.submit_transport == "mqtt":
+            self.publishMqtt()
+            return
+
+        url = self.mongo_url + "/LabMonitorDB/api/submit-sensor-data"
+        if self.submit_transport == "binary":
+            # One request per run of samples taken under the same comment
+            comment = self.pending[0][0]
+            batch = []
+            for entry in self.pending:
+                if entry[0] != comment:
+                    break
+                batch.append(entry[1])
+            status = self.sendDataMongo(url, self.packEnvelope(comment, batch))
+        else:
+            batch = self.pending[:]
+            # A single sample goes as an object, a backlog as one array
+            status = self.sendDataMongo(url, batch[0] if len(batch) == 1 else batch)
+        if status in (200, 201, 202) or (status is not None and 400 <= status < 500 and status != 429):
+            # Accepted, or refused for good (bad key or payload): do not resend
+            self.pending = self.pending[len(batch):]
+
     def sendDataMongo(self, url, data):
-        data = self.filterCpuReadings(data)
+        """POSTs one sample or a list of samples, or binary records (bytes).
+        Returns the HTTP status, or None when the request failed. On 429/503
+        the Retry-After delay is stored in self.retry_at_ns."""
+        binary = isinstance(data, bytes)
         print("-" * 40)
         print(f"Attempting to POST data to: {url}")
-        print(f"Payload: {json.dumps(data)}")
+        if binary:
+            print(f"Payload: {len(data)} bytes of binary records")
+        else:
+            print(f"Payload: {json.dumps(data)}")
         
         headers = {
-            'Content-Type': 'application/json',
+            'Content-Type': 'application/octet-stream' if binary else 'application/json',
             'Accept': 'application/json'
         }
         
@@ -512,27 +818,157 @@ class LabServer:
             headers['Authorization'] = f'Bearer {self.mongo_secret_key}'
         
         try:
-            response = self.requests.post(
-                url,
-                json=data,
-                headers=headers,
-                timeout=10 
-            )
-
-            if response.status_code in [200, 201]:
+            if binary:
+                response = self.requests.post(url, data=data, headers=headers, timeout=10)
+            else:
+                response = self.requests.post(
+                    url,
+                    json=data,
+                    headers=headers,
+                    timeout=10 
+                )
+            status = response.status_code
+
+            if status in [200, 201, 202]:
                 print("Data successfully sent!")
                 print("Server Response:", response.text)
             else:
-                print(f"Server returned status code: {response.status_code}")
+                print(f"Server returned status code: {status}")
+                if status in (429, 503):
+                    retry_after = self.parseRetryAfter(response.headers)
+                    self.retry_at_ns = time.monotonic_ns() + retry_after * 1_000_000_000
+                    print(f"Backing off for {retry_after}s")
                 try:
                     print("Server Error Details:", response.json())
                 except:
                     print("Server Error Text:", response.text)
 
             response.close()
+            return status
 
         except Exception as e:
             print(f"An error occurred during the POST request: {e}")
+            return None
+
+    ############################
+    # MQTT transport
+    ############################
+    def connectMqtt(self):
+        """Opens the persistent broker connection if it is not open. Returns
+        False (and waits MQTT_RETRY_SECONDS before the next try) on failure."""
+        if self.mqtt_connected:
+            return True
+        if MQTT is None:
+            print("MQTT transport selected but adafruit_minimqtt is not installed")
+            return False
+        try:
+            if self.mqtt is None:
+                self.mqtt = MQTT.MQTT(
+                    broker=self.mqtt_broker,
+                    port=self.mqtt_port,
+                    username=self.mqtt_username,
+                    password=self.mqtt_password,
+                    client_id=self.device_name,
+                    is_ssl=self.mqtt_port == 8883,
+                    keep_alive=MQTT_KEEP_ALIVE,
+                    socket_pool=self.pool,
+                    ssl_context=self.ssl_context,
+                )
+            self.mqtt.connect()
+            self.mqtt_connected = True
+            self.mqtt_last_ns = time.monotonic_ns()
+            print(f"Connected to MQTT broker {self.mqtt_broker}:{self.mqtt_port}")
+            return True
+        except Exception as e:
+            print(f"MQTT connection failed: {e}")
+            self.retry_at_ns = time.monotonic_ns() + MQTT_RETRY_SECONDS * 1_000_000_000
+            return False
+
+    def closeMqtt(self):
+        self.mqtt_connected = False
+        try:
+            self.mqtt.disconnect()
+        except Exception:
+            pass
+
+    def publishMqtt(self):
+        """Publishes pending samples, oldest first, to labmonitor/<device_name>
+        over the persistent connection. QoS 1: a sample leaves the queue only
+        once the broker has acknowledged it. Stops at the first failure and
+        reconnects on the next submission."""
+        if not self.connectMqtt():
+            return
+        topic = f"labmonitor/{self.device_name}"
+        sent = 0
+        try:
+            for sample in self.pending:
+                payload = json.dumps({k: v for k, v in sample.items() if k not in MQTT_SKIP_FIELDS})
+                self.mqtt.publish(topic, payload, qos=1)
+                sent += 1
+            self.mqtt_last_ns = time.monotonic_ns()
+            print(f"Published {sent} sample(s) to {topic}")
+        except Exception as e:
+            print(f"MQTT publish failed after {sent} sample(s): {e}")
+            self.closeMqtt()
+        self.pending = self.pending[sent:]
+
+    def mqttKeepAlive(self):
+        """Pings the broker when nothing was sent for half the keep-alive,
+        so long acquisition intervals do not drop the connection."""
+        if not self.mqtt_connected:
+            return
+        if time.monotonic_ns() - self.mqtt_last_ns < MQTT_KEEP_ALIVE * 500_000_000:
+            return
+        try:
+            self.mqtt.ping()
+            self.mqtt_last_ns = time.monotonic_ns()
+        except Exception as e:
+            print(f"MQTT keep-alive failed: {e}")
+            self.closeMqtt()
+
+    ############################
+    # Binary records
+    ############################
+    def packRecord(self, readings):
+        """Packs one reading into a fixed 62-byte record straight from the
+        sensor values, without building the JSON dict. CPU-fallback readings
+        are left out (presence bit clear), as in filterCpuReadings."""
+        sensData, utc = readings
+        present = 0
+        bit = 0
+        types = []
+        values = []
+        for data in sensData:
+            t = data.get('type')
+            types.append(SENSOR_TYPE_CODES.get(t, 0))
+            cpu = isinstance(t, str) and t.strip().upper().startswith("CPU")
+            for key in RECORD_CHANNELS:
+                value = NAN
+                if not cpu:
+                    try:
+                        value = float(data[key])
+                        present |= 1 << bit
+                    except (KeyError, TypeError, ValueError):
+                        pass
+                values.append(value)
+                bit += 1
+        return struct.pack(RECORD_FORMAT, RECORD_VERSION, present, utc or 0,
+                           types[0], types[1], types[2], *values)
+
+    def packEnvelope(self, comment, records):
+        parts = [struct.pack(ENVELOPE_FORMAT, b"LM", RECORD_VERSION, len(records))]
+        for text in (self.device_name, comment, version, self.sensors.sensDev.version, self.ip):
+            raw = (text or "").encode("utf-8")[:255]
+            parts.append(bytes([len(raw)]) + raw)
+        return b"".join(parts) + b"".join(records)
+
+    def parseRetryAfter(self, headers):
+        """Retry-After in seconds (the HTTP-date form is not supported)."""
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER
     
 ############################
 # Control, Sensors
@@ -623,8 +1059,8 @@ def stringToArray(string):
 ############################
 def main():
     conf = Conf()
-    sensors = Sensors(conf)
-    server = LabServer(sensors)
+    startup.mark("config")
+    server = LabServer(conf)
 
     server.serve_forever()
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Tiered retention to Parquet
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Moves samples older than ARCHIVE_AFTER_DAYS out of MongoDB into Parquet
+files under ARCHIVE_DIR, one folder per device and UTC month (see
+libArchive.py). /get-data reads both tiers, so archived ranges stay
+available to the viewer.
+
+Usage:
+    python3 archive_retention.py [--config config.cfg] [--days N]
+                                 [--file-rows 500000] [--batch-size 1000]
+                                 [--dry-run]
+
+The cutoff is midnight UTC, ARCHIVE_AFTER_DAYS days ago. It is recorded in
+the 'archive_state' collection before anything is moved, so the collector
+looks in the archive for older data from then on. Each part file is written
+and fsynced before the documents it holds are deleted from Mongo, in
+batches of --batch-size; an interrupted run is simply run again (documents
+archived twice are read back once).
+"""
+
+import os
+import sys
+import time
+import datetime
+import argparse
+from pymongo import MongoClient
+
+from libCollector import load_config
+
+try:
+    import libArchive
+except ImportError:
+    libArchive = None
+
+STATE_ID = "retention"
+
+def archive_cutoff(days):
+    today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - datetime.timedelta(days=days)
+
+def partitions(samples, cutoff):
+    """(device_name, 'YYYY-MM', count) for every partition with documents
+    older than the cutoff. Samples without a device name stay in Mongo."""
+    pipeline = [
+        {"$match": {"datetime_utc_pico": {"$lt": cutoff}, "device_name": {"$type": "string"}}},
+        {"$group": {
+            "_id": {"device": "$device_name",
+                    "month": {"$dateToString": {"format": "%Y-%m", "date": "$datetime_utc_pico"}}},
+            "n": {"$sum": 1}}},
+        {"$sort": {"_id.device": 1, "_id.month": 1}},
+    ]
+    for p in samples.aggregate(pipeline, allowDiskUse=True):
+        yield p["_id"]["device"], p["_id"]["month"], p["n"]
+
+def month_bounds(month):
+    y, m = (int(x) for x in month.split("-"))
+    start = datetime.datetime(y, m, 1)
+    end = datetime.datetime(y + 1, 1, 1) if m == 12 else datetime.datetime(y, m + 1, 1)
+    return start, end
+
+def archive_partition(samples, archive_dir, device, month, cutoff, file_rows, batch_size):
+    """Writes one device-month to part files of up to file_rows documents,
+    deleting each file's documents from Mongo once it is on disk."""
+    start, end = month_bounds(month)
+    query = {"device_name": device, "datetime_utc_pico": {"$gte": start, "$lt": min(end, cutoff)}}
+    moved = 0
+    while True:
+        docs = list(samples.find(query).sort([("datetime_utc_pico", 1), ("_id", 1)]).limit(file_rows))
+        if not docs:
+            break
+        path = libArchive.write_partition(archive_dir, device, month, docs)
+        ids = [d["_id"] for d in docs]
+        for i in range(0, len(ids), batch_size):
+            samples.delete_many({"_id": {"$in": ids[i:i + batch_size]}})
+        moved += len(docs)
+        print(f"    {len(docs):,} documents -> {os.path.relpath(path, archive_dir)}")
+    return moved
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old LabMonitor samples to Parquet.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg"))
+    parser.add_argument("--days", type=int, help="archive samples older than this (default: ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--file-rows", type=int, default=500000, help="max documents per Parquet part file")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per delete_many")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be archived, change nothing")
+    args = parser.parse_args()
+
+    if libArchive is None:
+        print("[ERROR] pyarrow is required: pip install pyarrow")
+        return 1
+
+    config = load_config(args.config)
+    days = args.days if args.days is not None else config.getint('ARCHIVE_AFTER_DAYS', 365)
+    archive_dir = config.get('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+    client = MongoClient(config.get('MONGO_AUTH_STRING'), serverSelectionTimeoutMS=5000)
+    db = client[config.get('DATABASE_NAME')]
+    samples = db[config.get('COLLECTION_NAME')]
+    state = db["archive_state"]
+
+    cutoff = archive_cutoff(days)
+    print(f"Archiving samples before {cutoff.isoformat()}Z to {archive_dir}")
+    if not args.dry_run:
+        # Published first: from now on the collector also reads the archive
+        # for anything older than the cutoff.
+        state.update_one({"_id": STATE_ID}, {"$max": {"archived_before": cutoff}}, upsert=True)
+
+    total = 0
+    t0 = time.monotonic()
+    for device, month, n in partitions(samples, cutoff):
+        print(f"  {device} {month}: {n:,} documents")
+        if args.dry_run:
+            total += n
+            continue
+        total += archive_partition(samples, archive_dir, device, month, cutoff, args.file_rows, args.batch_size)
+        rate = total / max(time.monotonic() - t0, 1e-6)
+        print(f"  {total:,} documents archived ({rate:,.0f}/s)")
+
+    print(f"Done: {total:,} documents {'to archive' if args.dry_run else 'archived'}.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Typed backfill of stored samples
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Applies the collector's ingest normalization (libCollector.normalize_sample)
+to documents stored before it existed: readings such as "23.4", "23.4 " or
+"--" become doubles or are removed, UTC becomes an int, and
+datetime_utc_pico is recomputed as a real UTC datetime.
+
+Usage:
+    python3 backfill_types.py [--config config.cfg] [--batch-size 1000]
+                              [--dry-run] [--restart]
+
+Documents are walked in _id order and rewritten with unordered bulk_write
+batches. The last _id done is checkpointed in the 'backfill_state'
+collection, so an interrupted run continues where it stopped (--restart
+starts again from the beginning).
+"""
+
+import os
+import sys
+import time
+import datetime
+import argparse
+from pymongo import MongoClient, UpdateOne
+
+from libCollector import load_config, normalize_sample
+
+CHECKPOINT_ID = "typed_backfill"
+
+def received_at(doc):
+    """Best estimate of when the collector received a stored document."""
+    s = doc.get("server_submission_time")
+    if isinstance(s, str):
+        try:
+            return datetime.datetime.fromisoformat(s)
+        except ValueError:
+            pass
+    return doc["_id"].generation_time.replace(tzinfo=None)
+
+def document_update(doc):
+    """UpdateOne that brings doc to the normalized form, or None if it
+    already is."""
+    normalized = normalize_sample(dict(doc), received_at(doc))
+    to_set = {k: v for k, v in normalized.items() if k not in doc or doc[k] != v or type(doc[k]) is not type(v)}
+    to_unset = {k: "" for k in doc if k not in normalized}
+    if not to_set and not to_unset:
+        return None
+    update = {}
+    if to_set:
+        update["$set"] = to_set
+    if to_unset:
+        update["$unset"] = to_unset
+    return UpdateOne({"_id": doc["_id"]}, update)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill typed readings into stored LabMonitor samples.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count documents to rewrite, change nothing")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first document")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    client = MongoClient(config.get('MONGO_AUTH_STRING'), serverSelectionTimeoutMS=5000)
+    db = client[config.get('DATABASE_NAME')]
+    samples = db[config.get('COLLECTION_NAME')]
+    state = db["backfill_state"]
+
+    checkpoint = None if args.restart else state.find_one({"_id": CHECKPOINT_ID})
+    last_id = checkpoint["last_id"] if checkpoint else None
+    if last_id is not None:
+        print(f"Resuming after _id {last_id}")
+
+    scanned = changed = 0
+    t0 = time.monotonic()
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        batch = list(samples.find(query).sort("_id", 1).limit(args.batch_size))
+        if not batch:
+            break
+        updates = [u for u in (document_update(doc) for doc in batch) if u is not None]
+        if updates and not args.dry_run:
+            samples.bulk_write(updates, ordered=False)
+        last_id = batch[-1]["_id"]
+        if not args.dry_run:
+            state.replace_one({"_id": CHECKPOINT_ID}, {"_id": CHECKPOINT_ID, "last_id": last_id}, upsert=True)
+        scanned += len(batch)
+        changed += len(updates)
+        rate = scanned / max(time.monotonic() - t0, 1e-6)
+        print(f"  {scanned:,} scanned, {changed:,} {'to rewrite' if args.dry_run else 'rewritten'} ({rate:,.0f}/s), last _id {last_id}")
+
+    print(f"Done: {scanned:,} documents scanned, {changed:,} {'to rewrite' if args.dry_run else 'rewritten'}.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - /get-data compression benchmark
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Fetches the same /get-data range with each content encoding and reports
+the bytes transferred and the time to download, decompress and parse the
+response (what the viewer spends before it can plot).
+
+Usage:
+    python3 bench_compression.py --api https://server/LabMonitorDB/api \\
+        --start 2026-10-01T00:00 --end 2026-10-08T00:00 [--device NAME]
+        [--format columnar] [--repeat 5]
+
+The requests carry no If-None-Match, so every run transfers the full body;
+after the first one the range comes from the server's day-chunk cache, so
+the medians compare encodings rather than Mongo query time.
+"""
+
+import sys
+import json
+import time
+import zlib
+import argparse
+import statistics
+import urllib.parse
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+def fetch(url, encoding):
+    req = urllib.request.Request(url, headers={"Accept-Encoding": encoding})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req) as r:
+        first = r.read(1)
+        ttfb = time.perf_counter() - t0
+        raw = first + r.read()
+        used = r.headers.get("Content-Encoding", "identity")
+    t_download = time.perf_counter() - t0
+    if used == "gzip":
+        body = zlib.decompress(raw, 31)
+    elif used == "br":
+        body = brotli.decompress(raw)
+    else:
+        body = raw
+    json.loads(body)
+    t_total = time.perf_counter() - t0
+    return {"encoding": used, "wire": len(raw), "body": len(body),
+            "ttfb": ttfb, "download": t_download, "total": t_total}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /get-data response compression.")
+    parser.add_argument("--api", required=True, help="API base URL, e.g. https://server/LabMonitorDB/api")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--device")
+    parser.add_argument("--format", default="json", choices=["json", "columnar"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    params = {"start": args.start, "end": args.end, "format": args.format}
+    if args.device:
+        params["device_name"] = args.device
+    url = f"{args.api.rstrip('/')}/get-data?{urllib.parse.urlencode(params)}"
+    print(f"GET {url}\n")
+
+    print(f"{'encoding':10}{'wire bytes':>14}{'ratio':>8}{'ttfb ms':>10}{'download ms':>13}{'load ms':>10}")
+    identity_size = None
+    for encoding in ENCODINGS:
+        if encoding == "br" and brotli is None:
+            print(f"{'br':10}  skipped (pip install brotli)")
+            continue
+        runs = [fetch(url, encoding) for _ in range(args.repeat)]
+        if runs[0]["encoding"] != encoding:
+            print(f"{encoding:10}  server answered with {runs[0]['encoding']}")
+            continue
+        wire = runs[0]["wire"]
+        identity_size = identity_size or runs[0]["body"]
+        ms = lambda key: statistics.median(r[key] for r in runs) * 1000
+        print(f"{encoding:10}{wire:>14,}{identity_size / wire:>7.1f}x{ms('ttfb'):>10.1f}{ms('download'):>13.1f}{ms('total'):>10.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
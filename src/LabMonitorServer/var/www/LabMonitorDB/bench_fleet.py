@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Fleet load test and benchmark
+# * v2026.10.19.3
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Load test for one data_collector.wsgi deployment: how many Picos it can
+take, and how fast viewer queries are on a large database.
+
+Run it against a local instance and a local mongod, never production, e.g.
+    mod_wsgi-express start-server data_collector.wsgi --port 8000 --threads 25
+For ingest, the instance's config.cfg must have RATE_LIMIT_PER_MINUTE=0
+(the default): any realistic per-device limit is far below --rate, so the
+run would mostly measure 429 answers. They are counted separately.
+
+Usage:
+    # N simulated devices posting assembleJson-shaped samples
+    python3 bench_fleet.py ingest --api http://localhost:8000 \\
+        --devices 200 --rate 1 --duration 60 [--binary]
+
+    # Seed a dataset directly into MongoDB (devices named bench-NNN)
+    python3 bench_fleet.py seed --docs 10000000 --devices 50 --days 365
+
+    # Replay viewer-style /get-data range queries
+    python3 bench_fleet.py query --api http://localhost:8000 \\
+        --clients 8 --requests 500 --spans 1h,1d,7d,30d [--uncached]
+
+    # Remove the seeded and simulated documents
+    python3 bench_fleet.py clean
+
+ingest and query report throughput and p50/p95/p99 latency, and append
+the result to bench_results.jsonl (--results). Each report is compared with
+the previous run of the same kind and parameters, so regressions show up as
+a percentage change.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import datetime
+import platform
+import threading
+import statistics
+import urllib.error
+import urllib.parse
+import urllib.request
+import concurrent.futures
+
+from libCollector import load_config, split_sample, normalize_sample
+from libRecord import encode_body
+
+DEVICE_PREFIX = "bench-"
+SPAN_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results.jsonl")
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg")
+
+def device_name(i):
+    return f"{DEVICE_PREFIX}{i:03d}"
+
+def pico_payload(name, secret, utc_ns, comment=""):
+    """A sample shaped like LabServer.assembleJson on the Pico: readings as
+    strings, one slot occasionally on a CPU fallback."""
+    t = 21.0 + 3.0 * random.random()
+    rh = 35.0 + 15.0 * random.random()
+    cpu = random.random() < 0.02
+    return {
+        "sens1_Temp": f"{t:.1f}", "sens1_RH": f"{rh:.1f}", "sens1_P": f"{1013 + random.random() * 5:.1f}",
+        "sens1_HI": f"{t + 0.5:.1f}", "sens1_type": "sensor",
+        "sens2_Temp": f"{t + random.random():.1f}" if not cpu else None, "sens2_RH": f"{rh - 2:.1f}" if not cpu else None,
+        "sens2_P": "--", "sens2_HI": "--", "sens2_type": "CPU adj" if cpu else "sensor",
+        "sens3_Temp": "--", "sens3_RH": "--", "sens3_P": "--", "sens3_HI": "--", "sens3_type": "--",
+        "ip": f"10.0.0.{sum(map(ord, name)) % 250}",
+        "version": "bench", "libSensors_version": "bench",
+        "UTC": utc_ns,
+        "mongo_url": "", "mongo_secret_key": secret,
+        "device_name": name, "is_pico_submit_mongo": True,
+        "user_comment": comment,
+    }
+
+def percentiles(latencies):
+    """p50/p95/p99 in ms."""
+    if len(latencies) < 2:
+        v = latencies[0] * 1000 if latencies else None
+        return {"p50_ms": v, "p95_ms": v, "p99_ms": v}
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": q[49] * 1000, "p95_ms": q[94] * 1000, "p99_ms": q[98] * 1000}
+
+def parse_span(span):
+    return int(float(span[:-1]) * SPAN_UNITS[span[-1]]) if span[-1] in SPAN_UNITS else int(span)
+
+# ------------------------------------------------------------------
+# ingest
+# ------------------------------------------------------------------
+def check_rate_limit(args, config):
+    """Warns when the per-device rate limit in --config would refuse part
+    of the offered load (the collector under test should run without one)."""
+    per_minute = config.getfloat('RATE_LIMIT_PER_MINUTE', 0.0)
+    if per_minute and args.rate * 60 > per_minute:
+        print(f"[WARNING] RATE_LIMIT_PER_MINUTE={per_minute:g} in {args.config} is below the offered "
+              f"{args.rate * 60:g} samples/min per device. Set RATE_LIMIT_PER_MINUTE=0 on the collector "
+              f"under test, or most requests will be answered 429.")
+
+def run_ingest(args, config):
+    check_rate_limit(args, config)
+    url = f"{args.api.rstrip('/')}/submit-sensor-data"
+    secret = args.secret or config.get('SERVER_SECRET_KEY')
+    interval = 1.0 / args.rate
+    t_end = time.monotonic() + args.duration
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+    sent_bytes = [0]
+
+    def device_loop(i):
+        name = device_name(i)
+        # Random phase, so devices do not all post on the same tick
+        scheduled = time.monotonic() + random.random() * interval
+        while scheduled < t_end:
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            payload = pico_payload(name, secret, time.time_ns())
+            if args.binary:
+                body = encode_body([payload])
+                headers = {"Content-Type": "application/octet-stream", "Authorization": f"Bearer {secret}"}
+            else:
+                body = json.dumps(payload).encode()
+                headers = {"Content-Type": "application/json"}
+            req = urllib.request.Request(url, data=body, headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=args.timeout) as r:
+                    r.read()
+                    status = str(r.status)
+            except urllib.error.HTTPError as e:
+                status = str(e.code)
+            except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+                status = type(e).__name__
+            # Measured from the scheduled send time: a server that makes
+            # devices fall behind is charged for the wait as well.
+            latency = time.monotonic() - scheduled
+            with lock:
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+                sent_bytes[0] += len(body)
+            scheduled += interval
+
+    print(f"POST {url}: {args.devices} devices x {args.rate}/s for {args.duration}s")
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=device_loop, args=(i,), daemon=True) for i in range(args.devices)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+
+    ok = sum(n for s, n in statuses.items() if s.startswith("2"))
+    rate_limited = statuses.get("429", 0)
+    if rate_limited:
+        print(f"[WARNING] {rate_limited} of {len(latencies)} requests were rate limited (429): "
+              f"throughput is capped by RATE_LIMIT_PER_MINUTE, not by the collector.")
+    return {
+        "requests": len(latencies),
+        "accepted": ok,
+        "rate_limited": rate_limited,
+        "statuses": statuses,
+        "throughput_rps": ok / elapsed,
+        "offered_rps": args.devices * args.rate,
+        "bytes_per_request": sent_bytes[0] / len(latencies) if latencies else 0,
+        **percentiles(latencies),
+    }
+
+# ------------------------------------------------------------------
+# seed / clean
+# ------------------------------------------------------------------
+def samples_collection(config):
+    from pymongo import MongoClient
+    client = MongoClient(config.get('MONGO_AUTH_STRING'), serverSelectionTimeoutMS=5000)
+    return client[config.get('DATABASE_NAME')][config.get('COLLECTION_NAME')]
+
+def run_seed(args, config):
+    """Inserts args.docs documents, normalized exactly as the collector
+    stores them, spread over args.devices devices and the last args.days."""
+    samples = samples_collection(config)
+    end = datetime.datetime.utcnow()
+    start = end - datetime.timedelta(days=args.days)
+    per_device = args.docs // args.devices
+    step = (end - start) / max(per_device, 1)
+    print(f"Seeding {per_device * args.devices:,} documents: {args.devices} devices, one every {step.total_seconds():.1f}s over {args.days} days")
+
+    inserted = 0
+    t0 = time.monotonic()
+    batch = []
+    for k in range(per_device):
+        t = start + k * step
+        utc_ns = int((t - datetime.datetime(1970, 1, 1)).total_seconds() * 1e9)
+        comment = f"run {k * 10 // per_device}" if args.comments else ""
+        for i in range(args.devices):
+            doc, _ = split_sample(pico_payload(device_name(i), "", utc_ns, comment))
+            batch.append(normalize_sample(doc, t))
+        if len(batch) >= args.batch_size:
+            samples.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+            rate = inserted / max(time.monotonic() - t0, 1e-6)
+            print(f"  {inserted:,} inserted ({rate:,.0f}/s)", end="\r")
+    if batch:
+        samples.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    print(f"\nDone: {inserted:,} documents in {time.monotonic() - t0:.0f}s.")
+    return None
+
+def run_clean(args, config):
+    samples = samples_collection(config)
+    n = samples.delete_many({"device_name": {"$regex": f"^{DEVICE_PREFIX}"}}).deleted_count
+    print(f"Deleted {n:,} benchmark documents.")
+    return None
+
+# ------------------------------------------------------------------
+# query
+# ------------------------------------------------------------------
+def run_query(args, config):
+    base = f"{args.api.rstrip('/')}/get-data"
+    spans = [parse_span(s) for s in args.spans.split(",")]
+    now = datetime.datetime.utcnow()
+    window_start = now - datetime.timedelta(days=args.days)
+    devices = [None] + [device_name(i) for i in range(args.devices)] if args.devices else [None]
+
+    def one_query(_):
+        span = random.choice(spans)
+        offset = random.random() * max((now - window_start).total_seconds() - span, 0)
+        start = window_start + datetime.timedelta(seconds=offset)
+        params = {"start": start.isoformat(timespec="minutes"),
+                  "end": (start + datetime.timedelta(seconds=span)).isoformat(timespec="minutes"),
+                  "format": "columnar"}
+        device = random.choice(devices)
+        if device:
+            params["device_name"] = device
+        if args.uncached:
+            # A limit routes the query past the day-chunk cache to MongoDB
+            params["limit"] = 100000
+        req = urllib.request.Request(f"{base}?{urllib.parse.urlencode(params)}",
+                                     headers={"Accept-Encoding": "gzip"})
+        t0 = time.monotonic()
+        try:
+            with urllib.request.urlopen(req, timeout=args.timeout) as r:
+                size = len(r.read())
+                status = str(r.status)
+        except urllib.error.HTTPError as e:
+            size, status = 0, str(e.code)
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+            size, status = 0, type(e).__name__
+        return time.monotonic() - t0, status, size
+
+    print(f"GET {base}: {args.requests} queries, {args.clients} clients, spans {args.spans}{' (uncached)' if args.uncached else ''}")
+    t0 = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(one_query, range(args.requests)))
+    elapsed = time.monotonic() - t0
+
+    statuses = {}
+    for _, status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [r for r in results if r[1] == "200"]
+    return {
+        "requests": len(results),
+        "statuses": statuses,
+        "throughput_rps": len(ok) / elapsed,
+        "wire_mb": sum(r[2] for r in ok) / 1e6,
+        **percentiles([r[0] for r in ok]),
+    }
+
+# ------------------------------------------------------------------
+# results
+# ------------------------------------------------------------------
+def run_params(args):
+    skip = {"command", "api", "secret", "config", "results", "timeout"}
+    return {k: v for k, v in sorted(vars(args).items()) if k not in skip}
+
+def previous_result(path, kind, params):
+    if not os.path.exists(path):
+        return None
+    last = None
+    with open(path) as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue
+            if r.get("kind") == kind and r.get("params") == params:
+                last = r
+    return last
+
+def report(result, previous):
+    print(f"\n{'':16}{'this run':>14}{'previous':>14}{'change':>10}")
+    keys = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms") + (("bytes_per_request",) if "bytes_per_request" in result else ())
+    for key in keys:
+        now = result.get(key)
+        before = previous["result"].get(key) if previous else None
+        change = f"{(now - before) / before * 100:+.1f}%" if now is not None and before else "--"
+        fmt = lambda v: f"{v:,.1f}" if v is not None else "--"
+        print(f"{key:16}{fmt(now):>14}{fmt(before):>14}{change:>10}")
+    print(f"statuses: {result['statuses']}")
+    if result.get("rate_limited"):
+        print(f"rate limited (429): {result['rate_limited']} of {result['requests']} requests")
+    if previous:
+        print(f"(previous run: {previous['time']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test and benchmark a LabMonitor collector.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON-lines file the results are appended to")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="simulate devices posting samples")
+    p.add_argument("--api", required=True, help="API base URL, e.g. http://localhost:8000")
+    p.add_argument("--secret", help="SERVER_SECRET_KEY (default: from --config)")
+    p.add_argument("--devices", type=int, default=50)
+    p.add_argument("--rate", type=float, default=1.0, help="samples per second per device")
+    p.add_argument("--duration", type=float, default=60.0, help="seconds")
+    p.add_argument("--timeout", type=float, default=10.0)
+    p.add_argument("--binary", action="store_true", help="post compact binary records instead of JSON")
+
+    p = sub.add_parser("seed", help="insert a synthetic dataset into MongoDB")
+    p.add_argument("--docs", type=int, default=1000000)
+    p.add_argument("--devices", type=int, default=20)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--batch-size", type=int, default=10000)
+    p.add_argument("--comments", action="store_true", help="give the samples user comments")
+
+    p = sub.add_parser("query", help="replay viewer-style /get-data range queries")
+    p.add_argument("--api", required=True)
+    p.add_argument("--clients", type=int, default=4, help="concurrent clients")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--spans", default="1h,1d,7d,30d", help="range lengths to pick from (m/h/d)")
+    p.add_argument("--days", type=int, default=365, help="queries fall within the last DAYS days")
+    p.add_argument("--devices", type=int, default=20, help="seeded devices to filter on (0: all devices only)")
+    p.add_argument("--uncached", action="store_true", help="bypass the server's day-chunk cache")
+    p.add_argument("--timeout", type=float, default=120.0)
+
+    sub.add_parser("clean", help="delete the seeded and simulated documents")
+
+    args = parser.parse_args()
+    config = load_config(args.config)
+    runners = {"ingest": run_ingest, "seed": run_seed, "query": run_query, "clean": run_clean}
+    result = runners[args.command](args, config)
+    if result is None:
+        return
+
+    params = run_params(args)
+    previous = previous_result(args.results, args.command, params)
+    report(result, previous)
+    with open(args.results, "a") as f:
+        f.write(json.dumps({
+            "time": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "kind": args.command,
+            "host": platform.node(),
+            "params": params,
+            "result": result,
+        }) + "\n")
+    print(f"Result appended to {args.results}")
+
+if __name__ == "__main__":
+    sys.exit(main())
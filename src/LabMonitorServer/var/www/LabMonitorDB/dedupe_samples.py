@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Remove duplicate samples
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Removes samples stored more than once (same device_name and Pico UTC,
+e.g. posted by both the Pico and the browser), keeping the first one
+stored, then creates the unique (device_name, UTC) index the collector
+uses to reject duplicates on ingest. The collector cannot create that index
+while duplicates exist.
+
+UTC is compared at the millisecond, like the collector stores it since
+UTC_RESOLUTION_NS: a copy re-posted by the browser differs from the
+original below that. Older samples are then truncated the same way, so the
+index sees both.
+
+Usage:
+    python3 dedupe_samples.py [--config config.cfg] [--batch-size 1000]
+                              [--dry-run]
+"""
+
+import os
+import sys
+import time
+import argparse
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+
+from libCollector import load_config, MIN_VALID_UTC_NS, UTC_RESOLUTION_NS
+
+# Must match UNIQUE_SAMPLE_FILTER in data_collector.wsgi
+UNIQUE_SAMPLE_FILTER = {"device_name": {"$type": "string"}, "UTC": {"$gte": MIN_VALID_UTC_NS}}
+# UTC truncated as normalize_sample stores it
+UTC_KEY = {"$subtract": ["$UTC", {"$mod": ["$UTC", UTC_RESOLUTION_NS]}]}
+UNTRUNCATED = {**UNIQUE_SAMPLE_FILTER, "$expr": {"$ne": [{"$mod": ["$UTC", UTC_RESOLUTION_NS]}, 0]}}
+
+def duplicate_ids(samples):
+    """Yields the _ids of every copy but the first of each duplicated sample."""
+    pipeline = [
+        {"$match": UNIQUE_SAMPLE_FILTER},
+        {"$group": {"_id": {"d": "$device_name", "u": UTC_KEY}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ]
+    for group in samples.aggregate(pipeline, allowDiskUse=True):
+        yield from sorted(group["ids"])[1:]
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove duplicate LabMonitor samples and create the unique index.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count duplicates, change nothing")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    client = MongoClient(config.get('MONGO_AUTH_STRING'), serverSelectionTimeoutMS=5000)
+    db = client[config.get('DATABASE_NAME')]
+    samples = db[config.get('COLLECTION_NAME')]
+
+    total = 0
+    t0 = time.monotonic()
+    batch = []
+    for oid in duplicate_ids(samples):
+        batch.append(oid)
+        if len(batch) >= args.batch_size:
+            if not args.dry_run:
+                samples.delete_many({"_id": {"$in": batch}})
+            total += len(batch)
+            batch = []
+            rate = total / max(time.monotonic() - t0, 1e-6)
+            print(f"  {total:,} duplicates {'found' if args.dry_run else 'removed'} ({rate:,.0f}/s)")
+    if batch and not args.dry_run:
+        samples.delete_many({"_id": {"$in": batch}})
+    total += len(batch)
+    print(f"Done: {total:,} duplicates {'to remove' if args.dry_run else 'removed'}.")
+
+    if args.dry_run:
+        print(f"{samples.count_documents(UNTRUNCATED):,} samples have a UTC to truncate to the millisecond.")
+    else:
+        try:
+            result = samples.update_many(UNTRUNCATED, [{"$set": {"UTC": UTC_KEY}}])
+            print(f"{result.modified_count:,} samples had their UTC truncated to the millisecond.")
+            samples.create_index([("device_name", 1), ("UTC", 1)], name="device_utc_unique", unique=True,
+                                 partialFilterExpression=UNIQUE_SAMPLE_FILTER)
+            print("Unique (device_name, UTC) index in place.")
+        except OperationFailure as e:
+            # New duplicates can arrive while the script runs on a live collector.
+            print(f"[ERROR] Could not truncate UTC or create the unique index: {e}. Run the script again.")
+            return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Fleet status and control
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Reads or changes the acquisition settings of many Picos at once, instead
+of opening each device's index.html.
+
+The devices and their IPs come from the devices registry: directly from
+MongoDB (config.cfg), or from the collector's /fleet-summary with --api
+when run from a machine on the lab network without database access.
+--hosts bypasses the registry. --match (regular expression on the device
+name) and --seen-within narrow the selection.
+
+Every device is contacted concurrently (--workers at a time), each request
+with a --timeout and up to --retries retries on connection errors and 5xx
+answers, so a fleet-wide change takes about as long as the slowest device.
+The result is one table row per device (--json for machine-readable
+output). The exit status is 1 if any device failed.
+
+    status      GET /api/acquisition_status
+    start/stop  POST /api/control, optionally with --interval/--comment
+    set         changes --interval and/or --comment, keeping each device's
+                current run/stop state
+
+Usage:
+    python3 fleet_control.py status [--match REGEX] [--seen-within 3600]
+    python3 fleet_control.py set --interval 60 --comment "run 12" [--match REGEX]
+    python3 fleet_control.py start|stop [--interval 60] [--comment TEXT]
+    python3 fleet_control.py status --api https://URL_server/LabMonitorDB/api
+    python3 fleet_control.py status --hosts 192.168.4.21,192.168.4.22
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import datetime
+import urllib.error
+import urllib.request
+import concurrent.futures
+
+from libCollector import load_config
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg")
+COMMANDS = {"running": "start", "stopped": "stop"}
+
+def registry_from_mongo(config):
+    """[{device_name, ip, seconds_since_last_seen}] from the devices collection."""
+    from libDatabase import Database, client_options
+    database = Database(config.get('MONGO_AUTH_STRING'), config.get('DATABASE_NAME'), config.get('COLLECTION_NAME'),
+                        config.get('DEVICES_COLLECTION_NAME', 'devices'), client_options(config))
+    now = datetime.datetime.utcnow()
+    devices = []
+    for d in database.devices.find({}, {"ip": 1, "last_seen": 1}).sort("_id", 1):
+        last_seen = d.get("last_seen")
+        devices.append({
+            "device_name": d["_id"],
+            "ip": d.get("ip"),
+            "seconds_since_last_seen": int((now - last_seen).total_seconds()) if last_seen else None,
+        })
+    database.client.close()
+    return devices
+
+def registry_from_api(api, timeout):
+    """The same list, from the collector's /fleet-summary."""
+    with urllib.request.urlopen(api.rstrip("/") + "/fleet-summary", timeout=timeout) as response:
+        return json.loads(response.read())["devices"]
+
+def select_devices(devices, match=None, seen_within=None):
+    pattern = re.compile(match) if match else None
+    selected = []
+    for d in devices:
+        if pattern and not pattern.search(d["device_name"]):
+            continue
+        age = d.get("seconds_since_last_seen")
+        if seen_within is not None and (age is None or age > seen_within):
+            continue
+        selected.append(d)
+    return selected
+
+def request_json(url, body=None, timeout=5.0, retries=2):
+    """GET (or POST body as JSON) and decode the answer. Retries connection
+    errors, timeouts and 5xx with a short doubling delay; 4xx answers are
+    final. Returns (payload, attempts); raises on the last failure."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if data is not None else {}
+    for attempt in range(retries + 1):
+        req = urllib.request.Request(url, data=data, headers=headers, method="POST" if data is not None else "GET")
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                return json.loads(response.read()), attempt + 1
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("message", e.reason)
+            except ValueError:
+                message = e.reason
+            error = RuntimeError(f"HTTP {e.code}: {message}")
+            if e.code < 500:
+                raise error
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            error = RuntimeError(getattr(e, "reason", None) or str(e) or type(e).__name__)
+        if attempt < retries:
+            time.sleep(0.25 * 2 ** attempt)
+    raise error
+
+def run_on_device(device, action, interval=None, comment=None, timeout=5.0, retries=2):
+    """One table row: the device's state after the action, or the error."""
+    base = f"http://{device['ip']}"
+    row = {"device_name": device["device_name"], "ip": device["ip"], "status": None,
+           "interval": None, "user_comment": None, "ms": None, "attempts": 0, "error": None}
+    t0 = time.perf_counter()
+    try:
+        if not device["ip"]:
+            raise RuntimeError("no IP in the registry")
+        if action in ("status", "set"):
+            state, attempts = request_json(f"{base}/api/acquisition_status", timeout=timeout, retries=retries)
+            row["attempts"] += attempts
+            row.update(status=state.get("status"), interval=state.get("interval"), user_comment=state.get("user_comment"))
+        if action != "status":
+            # /api/control only applies interval and comment together with a
+            # command, so "set" repeats the device's current one
+            body = {"command": COMMANDS.get(row["status"]) if action == "set" else action}
+            if body["command"] is None:
+                raise RuntimeError(f"unexpected status {row['status']!r}")
+            if interval is not None:
+                body["interval"] = interval
+            if comment is not None:
+                body["user_comment"] = comment
+                row["user_comment"] = comment
+            result, attempts = request_json(f"{base}/api/control", body, timeout=timeout, retries=retries)
+            row["attempts"] += attempts
+            row.update(status=result.get("status"), interval=result.get("interval"))
+    except Exception as e:
+        row["error"] = str(e)
+    row["ms"] = round((time.perf_counter() - t0) * 1000)
+    return row
+
+def fan_out(devices, action, workers=32, **kwargs):
+    """run_on_device on every device, at most workers at a time."""
+    if not devices:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(devices))) as pool:
+        futures = [pool.submit(run_on_device, d, action, **kwargs) for d in devices]
+        rows = [f.result() for f in concurrent.futures.as_completed(futures)]
+    return sorted(rows, key=lambda r: r["device_name"])
+
+def print_table(rows):
+    columns = ("device_name", "ip", "status", "interval", "user_comment", "ms", "error")
+    cells = [[("" if r[c] is None else str(r[c])) for c in columns] for r in rows]
+    widths = [max([len(c)] + [len(row[i]) for row in cells]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip())
+    print("  ".join("-" * w for w in widths))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)).rstrip())
+
+def main():
+    parser = argparse.ArgumentParser(description="Read or change the acquisition settings of many Picos concurrently.")
+    parser.add_argument("action", choices=("status", "start", "stop", "set"))
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--api", help="read the registry from this collector API instead of MongoDB")
+    parser.add_argument("--hosts", help="comma-separated device IPs, bypassing the registry")
+    parser.add_argument("--match", help="only devices whose name matches this regular expression")
+    parser.add_argument("--seen-within", type=int, help="only devices that submitted in the last N seconds")
+    parser.add_argument("--interval", type=float, help="acquisition interval in seconds (>= 1)")
+    parser.add_argument("--comment", help="user comment ('' clears it)")
+    parser.add_argument("--workers", type=int, default=32, help="devices contacted at the same time")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds per request")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = parser.parse_args()
+
+    if args.interval is not None and args.interval < 1:
+        parser.error("--interval must be at least 1 second")
+    if args.action == "set" and args.interval is None and args.comment is None:
+        parser.error("set needs --interval and/or --comment")
+
+    t0 = time.perf_counter()
+    if args.hosts:
+        devices = [{"device_name": h.strip(), "ip": h.strip()} for h in args.hosts.split(",") if h.strip()]
+    else:
+        try:
+            devices = registry_from_api(args.api, args.timeout) if args.api else registry_from_mongo(load_config(args.config))
+        except Exception as e:
+            print(f"[ERROR] Could not read the devices registry: {e}")
+            return 1
+    devices = select_devices(devices, args.match, args.seen_within)
+    if not devices:
+        print("No devices selected.")
+        return 1
+
+    rows = fan_out(devices, args.action, args.workers, interval=args.interval, comment=args.comment,
+                   timeout=args.timeout, retries=args.retries)
+    failed = sum(1 for r in rows if r["error"])
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+        print(f"\n{len(rows)} devices: {len(rows) - failed} ok, {failed} failed in {time.perf_counter() - t0:.1f} s.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# **********************************************
+# * LabMonitor - Backend Parquet archive tier
+# * v2026.10.19.2
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Parquet archive for samples moved out of MongoDB by archive_retention.py.
+
+Layout (hive partitioning, one folder per device and UTC month):
+
+    <ARCHIVE_DIR>/device_name=<url-quoted name>/month=YYYY-MM/part-*.parquet
+
+Files are sorted by datetime_utc_pico and written in row groups of
+ROW_GROUP_SIZE rows, so a time-range read only decodes the row groups whose
+statistics overlap the range, and only the requested columns.
+
+Fields without a column of their own (another sensor, gateway or MQTT
+extras), or whose value does not fit its column's type, are kept as
+Extended JSON in the 'extra' column and restored on read: archive_retention.py
+deletes the Mongo documents afterwards, so nothing may be dropped here.
+"""
+
+import os
+import datetime
+import urllib.parse
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+from bson import ObjectId, json_util
+
+from libCollector import READING_SUFFIXES, to_float_or_none
+
+ROW_GROUP_SIZE = 65536
+
+READING_COLUMNS = [f"sens{i}_{suffix}" for i in (1, 2, 3) for suffix in READING_SUFFIXES]
+TEXT_COLUMNS = ["sens1_type", "sens2_type", "sens3_type", "user_comment",
+                "server_submission_time"]
+
+# device_name and month are partition keys: they live in the folder names.
+ARCHIVE_SCHEMA = pa.schema(
+    [("_id", pa.string()),
+     ("datetime_utc_pico", pa.timestamp("ms")),
+     ("UTC", pa.int64())] +
+    [(c, pa.float64()) for c in READING_COLUMNS] +
+    [(c, pa.string()) for c in TEXT_COLUMNS] +
+    [("extra", pa.string())]
+)
+
+PARTITION_SCHEMA = pa.schema([("device_name", pa.string()), ("month", pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+# Read with the full schema, so older parts (other columns) and newer ones
+# are read the same way whatever file the dataset lists first.
+DATASET_SCHEMA = pa.unify_schemas([ARCHIVE_SCHEMA, PARTITION_SCHEMA])
+
+def months_between(start, end):
+    """UTC months overlapping [start, end)."""
+    months = []
+    y, m = start.year, start.month
+    while datetime.datetime(y, m, 1) < end:
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+def partition_dir(archive_dir, device_name, month):
+    return os.path.join(archive_dir,
+                        f"device_name={urllib.parse.quote(device_name, safe='')}",
+                        f"month={month}")
+
+def fits_column(name, value):
+    """True if value is stored exactly by the archive column `name`."""
+    if name in ("_id", "datetime_utc_pico"):
+        return True
+    if name == "UTC":
+        return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+    if name in READING_COLUMNS:
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and to_float_or_none(value) is not None
+    if name in TEXT_COLUMNS:
+        return isinstance(value, str)
+    return False
+
+def extra_fields(doc):
+    """Extended JSON of the fields of doc that fit no column, or None."""
+    extra = {k: v for k, v in doc.items() if k != "device_name" and v is not None and not fits_column(k, v)}
+    return json_util.dumps(extra, json_options=json_util.CANONICAL_JSON_OPTIONS) if extra else None
+
+def write_partition(archive_dir, device_name, month, docs):
+    """Writes docs (one device, one month) to a new part file and returns its
+    path. The file is written under a temporary name, fsynced and renamed,
+    so a crash never leaves a truncated part behind."""
+    docs = sorted(docs, key=lambda d: (d["datetime_utc_pico"], d["_id"]))
+    columns = {
+        "_id": [str(d["_id"]) for d in docs],
+        "datetime_utc_pico": [d["datetime_utc_pico"] for d in docs],
+    }
+    for c in ["UTC"] + READING_COLUMNS + TEXT_COLUMNS:
+        columns[c] = [d.get(c) if fits_column(c, d.get(c)) else None for d in docs]
+    columns["extra"] = [extra_fields(d) for d in docs]
+    table = pa.table(columns, schema=ARCHIVE_SCHEMA)
+
+    folder = partition_dir(archive_dir, device_name, month)
+    os.makedirs(folder, exist_ok=True)
+    name = f"part-{docs[0]['_id']}-{docs[-1]['_id']}.parquet"
+    path = os.path.join(folder, name)
+    tmp = os.path.join(folder, f".{name}.tmp")   # dot files are not listed by readers
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+def ms_scalar(dt):
+    """Timestamp scalar for filters, truncated to the stored ms precision."""
+    return pa.scalar(dt.replace(microsecond=dt.microsecond // 1000 * 1000), pa.timestamp("ms"))
+
+def read_range(archive_dir, device_name, start, end, columns=None, after=None, limit=None):
+    """Archived documents in [start, end) (naive UTC), optionally for one
+    device, as dicts sorted by (datetime_utc_pico, _id). Only the month
+    partitions in range are listed, only `columns` are decoded, and row
+    groups outside the time range are skipped using their statistics.
+
+    after=(datetime, ObjectId or None) keeps only documents strictly after
+    that keyset position. With a limit, the range is read in windows that
+    start at one day and double until `limit` documents are found, so a
+    page costs about its own size rather than the rest of the range."""
+    if not os.path.isdir(archive_dir):
+        return []
+    dataset = ds.dataset(archive_dir, schema=DATASET_SCHEMA, format="parquet", partitioning=PARTITIONING)
+    if limit is None:
+        return _read_window(dataset, device_name, start, end, columns, after)
+    docs = []
+    span = datetime.timedelta(days=1)
+    while start < end and len(docs) < limit:
+        stop = min(end, start + span)
+        docs += _read_window(dataset, device_name, start, stop, columns, after)
+        start = stop
+        span *= 2
+    return docs[:limit]
+
+def _read_window(dataset, device_name, start, end, columns, after):
+    flt = ((ds.field("month").isin(months_between(start, end))) &
+           (ds.field("datetime_utc_pico") >= ms_scalar(start)) &
+           (ds.field("datetime_utc_pico") < ms_scalar(end)))
+    if device_name:
+        flt = flt & (ds.field("device_name") == device_name)
+    if after is not None:
+        after_dt, after_id = after
+        key = ds.field("datetime_utc_pico") > ms_scalar(after_dt)
+        if after_id is not None:
+            # Hex ObjectId strings sort like the ids themselves
+            key = key | ((ds.field("datetime_utc_pico") == ms_scalar(after_dt)) &
+                         (ds.field("_id") > str(after_id)))
+        flt = flt & key
+
+    names = set(dataset.schema.names)
+    wanted = ["_id", "datetime_utc_pico", "device_name"]
+    if columns:
+        wanted += [c for c in columns if c in names and c not in wanted]
+    else:
+        wanted += [c for c in ARCHIVE_SCHEMA.names if c not in wanted]
+    if "extra" not in wanted:
+        wanted.append("extra")
+    table = dataset.to_table(columns=wanted, filter=flt)
+
+    docs = table.to_pylist()
+    seen = set()
+    out = []
+    for d in docs:
+        # A retention run interrupted between writing and deleting archives
+        # the same documents again on the next run; keep one copy.
+        if d["_id"] in seen:
+            continue
+        seen.add(d["_id"])
+        d["_id"] = ObjectId(d["_id"])
+        extra = d.pop("extra", None)
+        d = {k: v for k, v in d.items() if v is not None}
+        if extra:
+            d.update((k, v) for k, v in json_util.loads(extra).items() if not columns or k in columns)
+        out.append(d)
+    out.sort(key=lambda d: (d["datetime_utc_pico"], d["_id"]))
+    return out
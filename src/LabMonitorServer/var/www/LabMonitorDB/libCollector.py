@@ -0,0 +1,375 @@
+# **********************************************
+# * LabMonitor - Backend shared helpers
+# * v2026.10.19.3
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Helpers shared by data_collector.wsgi, mqtt_bridge.py and the
+maintenance scripts in this folder."""
+
+import time
+import queue
+import datetime
+import threading
+import configparser
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from libDatabase import DatabaseUnavailable
+
+# Sent by the Pico with every reading, but only needed to reach and
+# authenticate with the collector. Never stored.
+TRANSPORT_FIELDS = ("mongo_url", "mongo_secret_key", "is_pico_submit_mongo")
+
+# Static per-device metadata. Kept once per device in the devices
+# registry instead of in every sample.
+METADATA_FIELDS = ("ip", "version", "libSensors_version")
+
+# Per-sensor numeric channels: sens<N>_<suffix>. Stored as doubles, or
+# left out of the document when there is no valid reading.
+READING_SUFFIXES = ("Temp", "RH", "P", "HI", "IAQ", "TVOC", "eCO2")
+
+# Pico UTC values before this (ns) mean NTP never synced (getUTC returns 0).
+MIN_VALID_UTC_NS = 1_577_836_800 * 1_000_000_000   # 2020-01-01
+# Clock values further ahead of the server than this are invalid too
+MAX_UTC_AHEAD_NS = 86_400 * 1_000_000_000           # 1 day
+# Stored UTC values are truncated to this (1 ms). Samples re-posted from the
+# Pico web page went through JSON.parse, i.e. a float64, which keeps only
+# ~256 ns of an epoch in ns: the same reading must map to the same key.
+UTC_RESOLUTION_NS = 1_000_000
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+DUPLICATE_KEY = 11000
+
+def load_config(path):
+    """Reads config.cfg (plain KEY=value lines, no section header) and
+    returns its DEFAULT section."""
+    config = configparser.ConfigParser(allow_no_value=True)
+    with open(path, 'r') as f:
+        config.read_string(f'[DEFAULT]\n{f.read()}')
+    return config['DEFAULT']
+
+def split_sample(data):
+    """Splits a submitted payload into the document to store (measurements
+    plus device_name as the reference into the registry) and the device
+    metadata. Transport and auth fields are dropped from both."""
+    sample = {}
+    meta = {}
+    for key, value in data.items():
+        if key in TRANSPORT_FIELDS:
+            continue
+        if key in METADATA_FIELDS:
+            meta[key] = value
+        else:
+            sample[key] = value
+    return sample, meta
+
+def is_reading_field(key):
+    """True for sensor channels such as sens1_Temp or sens2_RH."""
+    prefix, _, suffix = key.partition("_")
+    return prefix.startswith("sens") and prefix[4:].isdigit() and suffix in READING_SUFFIXES
+
+def to_float_or_none(v):
+    """Parses a reading. "--", "", None, booleans, NaN/inf and garbage become
+    None; "23.4 " (the CPU raw fallback carries a trailing space) is 23.4."""
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        f = float(v.strip() if isinstance(v, str) else v)
+    except (TypeError, ValueError):
+        return None
+    return f if f == f and f not in (float('inf'), float('-inf')) else None
+
+def to_int_or_none(v):
+    """Parses an integer such as a ns timestamp. Integer strings are parsed
+    exactly (a float64 would lose anything beyond 2**53); only strings with
+    a decimal point or an exponent go through float."""
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, int):
+        return v
+    try:
+        if isinstance(v, str):
+            s = v.strip()
+            if not any(c in s for c in ".eE"):
+                return int(s)
+            v = s
+        return int(float(v))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def utc_from_ns(ns):
+    """Naive UTC datetime from epoch nanoseconds, truncated to the
+    millisecond precision BSON stores. Integer arithmetic, and never the
+    server's local time zone."""
+    return _EPOCH + datetime.timedelta(milliseconds=ns // 1_000_000)
+
+def ns_from_utc(dt):
+    """Epoch nanoseconds of a naive UTC datetime."""
+    return (dt - _EPOCH) // datetime.timedelta(microseconds=1) * 1000
+
+def valid_utc_ns(ns, received_at):
+    """True for a clock value between MIN_VALID_UTC_NS and one day after
+    received_at. Anything else is an unsynced or broken clock, and values
+    of 2**63 and more cannot even be stored."""
+    return MIN_VALID_UTC_NS <= ns <= ns_from_utc(received_at) + MAX_UTC_AHEAD_NS
+
+def normalize_sample(sample, received_at):
+    """Coerces a sample in place to the stored types and returns it:
+    readings become doubles or are removed, UTC becomes an int truncated
+    to UTC_RESOLUTION_NS, and datetime_utc_pico is always a UTC datetime (the Pico's clock when it
+    was synced, received_at otherwise). A UTC that is not a number or is
+    out of the valid range (see valid_utc_ns) is stored as 0, like an
+    unsynced clock. received_at is a
+    naive UTC datetime; server_submission_time keeps its ISO string form."""
+    for key in list(sample):
+        if is_reading_field(key):
+            value = to_float_or_none(sample[key])
+            if value is None:
+                del sample[key]
+            else:
+                sample[key] = value
+
+    if "server_submission_time" not in sample:
+        sample["server_submission_time"] = received_at.isoformat()
+
+    utc = to_int_or_none(sample.get("UTC"))
+    if utc is not None and valid_utc_ns(utc, received_at):
+        sample["UTC"] = utc - utc % UTC_RESOLUTION_NS
+        sample["datetime_utc_pico"] = utc_from_ns(utc)
+    else:
+        if "UTC" in sample:
+            sample["UTC"] = 0
+        sample["datetime_utc_pico"] = received_at
+
+    client_ms = to_int_or_none(sample.get("client_submission_time"))
+    if client_ms is not None and valid_utc_ns(client_ms * 1_000_000, received_at):
+        sample["client_submission_time"] = client_ms
+        sample["datetime_utc_client"] = utc_from_ns(client_ms * 1_000_000)
+    elif client_ms is not None:
+        del sample["client_submission_time"]
+    return sample
+
+def device_registry_updates(entries, known_meta):
+    """Folds a batch of (sample, metadata) pairs into one upsert per device
+    for the devices collection: first/last seen and sample count always,
+    metadata only when it differs from known_meta (the last values written).
+    Returns the updates and the metadata they will write."""
+    per_device = {}
+    for doc, meta in entries:
+        name = doc.get("device_name")
+        if not name:
+            continue
+        seen = doc.get("datetime_utc_pico") or datetime.datetime.utcnow()
+        entry = per_device.get(name)
+        if entry is None:
+            per_device[name] = {"count": 1, "first": seen, "last": seen, "doc": doc, "meta": meta}
+            continue
+        entry["count"] += 1
+        entry["first"] = min(entry["first"], seen)
+        if seen >= entry["last"]:
+            entry["last"] = seen
+            entry["doc"] = doc
+            entry["meta"] = meta
+
+    updates = []
+    written_meta = {}
+    for name, entry in per_device.items():
+        update = {
+            "$min": {"first_seen": entry["first"]},
+            "$max": {"last_seen": entry["last"]},
+            "$inc": {"sample_count": entry["count"]},
+        }
+        meta = {f: (entry["meta"] or {}).get(f) for f in METADATA_FIELDS}
+        meta["sensor_types"] = [entry["doc"].get(f"sens{i}_type") for i in (1, 2, 3)]
+        if known_meta.get(name) != meta:
+            update["$set"] = meta
+            written_meta[name] = meta
+        updates.append(UpdateOne({"_id": name}, update, upsert=True))
+    return updates, written_meta
+
+class BulkWriter:
+    """Bounded in-process queue of (sample, metadata) pairs drained by one
+    background thread, used by submit-sensor-data and by mqtt_bridge.py.
+
+    Producers only enqueue; the writer flushes with unordered insert_many
+    batches once batch_size documents are waiting or the oldest has waited
+    flush_seconds, so a burst costs a few round trips to Mongo instead of
+    one per sample, plus one devices-registry upsert per device.
+
+    Samples already stored (same device_name and UTC) fail the unique index
+    and are dropped, counted as duplicates: clients may resend freely.
+
+    While MongoDB is unreachable the batch is held and retried until the
+    database is back, so the queue fills up and producers are pushed back
+    instead of losing what was accepted. Other errors are retried
+    MAX_ATTEMPTS times, then the batch is counted as failed.
+
+    listeners are called with the documents stored by each flush. settled
+    listeners are called with every document of a flush that needs no
+    retry (stored, duplicate or rejected by the server), i.e. all of them
+    unless the insert itself failed.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, database, maxsize, batch_size, flush_seconds, reconnect_max_seconds=30.0, name="ingest-writer"):
+        self.database = database
+        self.known_meta = {}    # device_name -> metadata last written to the registry
+        self.listeners = []     # callables notified with the documents of each flush
+        self.settled_listeners = []
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, doc, meta=None, block=False):
+        """Enqueues a sample and its device metadata. Returns False when the
+        queue is full (never with block=True, which waits for room)."""
+        try:
+            self.queue.put((doc, meta), block=block)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("accepted")
+        return True
+
+    def stop(self, timeout=10):
+        """Stops the writer after flushing everything still queued."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        print(f"[INFO] {self._thread.name} stopped. {self.queue.qsize()} documents left unflushed.")
+
+    def snapshot(self):
+        """Queue depth and flush metrics."""
+        with self._lock:
+            out = dict(self.stats)
+        out["queue_depth"] = self.queue.qsize()
+        out["queue_capacity"] = self.queue.maxsize
+        out["avg_flush_ms"] = out["total_flush_ms"] / out["batches"] if out["batches"] else 0.0
+        return out
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _next_batch(self):
+        """Blocks for the first document, then gathers more until the batch
+        is full or flush_seconds have passed since the first one arrived."""
+        try:
+            batch = [self.queue.get(timeout=self.flush_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                remaining = 0
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        t0 = time.monotonic()
+        duplicates = 0
+        attempt = 0
+        retried = False
+        settled = False
+        while True:
+            written = []
+            try:
+                self.database.samples.insert_many([doc for doc, _ in batch], ordered=False)
+                written = batch
+                settled = True
+                break
+            except BulkWriteError as e:
+                # Unordered: everything but the reported errors was written.
+                rejected = set()
+                for err in e.details.get("writeErrors", []):
+                    if err.get("code") == DUPLICATE_KEY:
+                        if retried and "_id" in (err.get("keyPattern") or {}):
+                            # Written by the earlier attempt that then failed
+                            continue
+                        duplicates += 1
+                    rejected.add(err["index"])
+                written = [entry for i, entry in enumerate(batch) if i not in rejected]
+                settled = True
+                if len(rejected) > duplicates:
+                    print(f"[ERROR] Bulk insert: {len(rejected) - duplicates} of {len(batch)} documents rejected.")
+                break
+            except (DatabaseUnavailable, ConnectionFailure) as e:
+                # Not counted as an attempt: wait for the database to return
+                if self._stop.is_set():
+                    print(f"[ERROR] Bulk insert abandoned at shutdown, database unavailable: {e}")
+                    break
+                print(f"[ERROR] Bulk insert waiting for the database: {e}")
+                retried = True
+                self._stop.wait(min(max(self.database.retry_in(), 1.0), self.reconnect_max_seconds))
+            except Exception as e:
+                attempt += 1
+                print(f"[ERROR] Bulk insert attempt {attempt}/{self.MAX_ATTEMPTS} failed: {e}")
+                if attempt >= self.MAX_ATTEMPTS:
+                    break
+                retried = True
+                time.sleep(attempt)
+        inserted, failed = len(written), len(batch) - len(written) - duplicates
+        self._update_registry(written)
+        self._notify(self.listeners, [doc for doc, _ in written])
+        if settled:
+            self._notify(self.settled_listeners, [doc for doc, _ in batch])
+        elapsed_ms = (time.monotonic() - t0) * 1000
+        with self._lock:
+            self.stats["inserted"] += inserted
+            self.stats["duplicates"] += duplicates
+            self.stats["failed"] += failed
+            self.stats["batches"] += 1
+            self.stats["last_flush_ms"] = elapsed_ms
+            self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed_ms)
+            self.stats["total_flush_ms"] += elapsed_ms
+        print(f"[INFO] Flushed {inserted}/{len(batch)} documents ({duplicates} duplicates) in {elapsed_ms:.1f} ms.")
+
+    def _notify(self, listeners, docs):
+        if not docs:
+            return
+        for listener in listeners:
+            try:
+                listener(docs)
+            except Exception as e:
+                print(f"[ERROR] Writer listener {listener} failed: {e}")
+
+    def _update_registry(self, entries):
+        updates, written_meta = device_registry_updates(entries, self.known_meta)
+        if not updates:
+            return
+        try:
+            self.database.devices.bulk_write(updates, ordered=False)
+            self.known_meta.update(written_meta)
+        except Exception as e:
+            print(f"[ERROR] Devices registry update failed: {e}")
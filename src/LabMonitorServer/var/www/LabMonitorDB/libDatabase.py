@@ -0,0 +1,203 @@
+# **********************************************
+# * LabMonitor - Backend MongoDB access layer
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Lazily connected, self-healing MongoDB handle for the collector.
+
+Nothing is contacted at import time. The first caller that needs the
+database creates the MongoClient and checks it with a ping; if that fails,
+further attempts are refused until a backoff delay (doubling up to
+MONGO_RECONNECT_MAX_SECONDS) has passed, so requests fail fast with 503
+instead of each waiting for a server selection timeout. Once a client
+exists, pymongo's own monitor reconnects it after a MongoDB restart, and
+available() follows the last ping instead: one caller pings at most every
+health_ttl seconds while the others get the cached answer, so a MongoDB
+outage costs one blocked request per interval rather than every request.
+
+Hooks registered with on_connect() run once, after the first successful
+connection (index creation, registry seeding, change stream start). Other
+threads wait while they run. A hook that raises is run again on a later
+call, after the same kind of doubling delay; the others are not repeated.
+"""
+
+import time
+import threading
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+class DatabaseUnavailable(Exception):
+    """MongoDB cannot be reached (or is in its reconnect backoff)."""
+
+def client_options(config):
+    """MongoClient keyword arguments from config.cfg (MONGO_* keys)."""
+    w = config.get('MONGO_WRITE_CONCERN', '1')
+    return {
+        "maxPoolSize": config.getint('MONGO_MAX_POOL_SIZE', 50),
+        "minPoolSize": config.getint('MONGO_MIN_POOL_SIZE', 0),
+        "maxIdleTimeMS": config.getint('MONGO_MAX_IDLE_TIME_MS', 60000),
+        "serverSelectionTimeoutMS": config.getint('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        "connectTimeoutMS": config.getint('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        "socketTimeoutMS": config.getint('MONGO_SOCKET_TIMEOUT_MS', 30000),
+        "w": int(w) if w.isdigit() else w,
+        "wTimeoutMS": config.getint('MONGO_WTIMEOUT_MS', 5000),
+    }
+
+class Database:
+
+    def __init__(self, uri, database_name, collection_name, devices_collection_name,
+                 options=None, reconnect_max_seconds=30.0, health_ttl=5.0):
+        self.uri = uri
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.devices_collection_name = devices_collection_name
+        self.options = options or {}
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self.health_ttl = health_ttl
+        self._client = None
+        self._pending_hooks = []
+        self._hooks_done = False
+        self._hooks_thread = None
+        self._hook_failures = 0
+        self._hooks_retry_at = 0.0
+        self._lock = threading.Lock()
+        self._hooks_lock = threading.RLock()
+        self._failures = 0
+        self._next_attempt = 0.0
+        self._last_error = None
+        self._health = None
+        self._health_checked = 0.0
+        self._health_lock = threading.Lock()
+
+    def on_connect(self, hook):
+        """Registers hook(database) to run after the first connection (or
+        right away when already connected)."""
+        with self._hooks_lock:
+            self._pending_hooks.append(hook)
+            self._hooks_done = False
+        if self._client is not None:
+            self._run_hooks()
+
+    # -- connection -------------------------------------------------------
+    def _ensure(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if time.monotonic() < self._next_attempt:
+                        raise DatabaseUnavailable(f"MongoDB unavailable, retrying in {self.retry_in():.0f} s: {self._last_error}")
+                    self._connect()
+        self._run_hooks()
+
+    def _connect(self):
+        client = None
+        try:
+            client = MongoClient(self.uri, **self.options)
+            client.admin.command('ping')
+        except Exception as e:
+            if client is not None:
+                client.close()
+            self._failures += 1
+            delay = min(self.reconnect_max_seconds, 2 ** (self._failures - 1))
+            self._next_attempt = time.monotonic() + delay
+            self._last_error = e
+            print(f"[CRITICAL ERROR] Could not connect or authorize with MongoDB (attempt {self._failures}, next in {delay} s): {e}")
+            raise DatabaseUnavailable(str(e)) from e
+        self._client = client
+        self._failures = 0
+        self._last_error = None
+        self._health = {"ok": True, "latency_ms": None, "error": None}
+        self._health_checked = time.monotonic()
+        print("Successfully connected and authorized with MongoDB.")
+
+    def _run_hooks(self):
+        # A hook that uses the database comes back here from its own thread.
+        if self._hooks_done or self._hooks_thread == threading.get_ident():
+            return
+        with self._hooks_lock:
+            if self._hooks_done or time.monotonic() < self._hooks_retry_at:
+                return
+            self._hooks_thread = threading.get_ident()
+            try:
+                hooks = list(self._pending_hooks)
+                failed = [hook for hook in hooks if not self._run_hook(hook)]
+                self._pending_hooks = failed + self._pending_hooks[len(hooks):]
+            finally:
+                self._hooks_thread = None
+            if self._pending_hooks:
+                self._hook_failures += 1
+                delay = min(self.reconnect_max_seconds, 2 ** (self._hook_failures - 1))
+                self._hooks_retry_at = time.monotonic() + delay
+                print(f"[WARNING] {len(self._pending_hooks)} database on-connect hook(s) will be retried in {delay} s.")
+            else:
+                self._hook_failures = 0
+                self._hooks_done = True
+
+    def _run_hook(self, hook):
+        """Runs one hook; False if it raised."""
+        try:
+            hook(self)
+            return True
+        except Exception as e:
+            print(f"[ERROR] Database on-connect hook {hook.__name__} failed: {e}")
+            return False
+
+    def available(self):
+        """True if the database can be used now: connected (connecting if
+        needed) and the last ping, at most health_ttl seconds old, passed."""
+        try:
+            self._ensure()
+        except DatabaseUnavailable:
+            return False
+        return self.health()["ok"]
+
+    def retry_in(self):
+        """Seconds until the next connection attempt, or the next ping
+        while the last one failed."""
+        now = time.monotonic()
+        wait = self._next_attempt - now
+        if self._health is not None and not self._health["ok"]:
+            wait = max(wait, self._health_checked + self.health_ttl - now)
+        return max(0.0, wait)
+
+    # -- handles ----------------------------------------------------------
+    @property
+    def client(self):
+        self._ensure()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.database_name]
+
+    @property
+    def samples(self):
+        return self.db[self.collection_name]
+
+    @property
+    def devices(self):
+        return self.db[self.devices_collection_name]
+
+    # -- health -----------------------------------------------------------
+    def health(self):
+        """Ping result, cached for health_ttl seconds so requests and
+        monitoring probes do not add load: {"ok", "latency_ms", "error",
+        "checked_seconds_ago"}. While one thread pings, the others get the
+        cached result rather than waiting for it."""
+        if self._health is None or time.monotonic() - self._health_checked >= self.health_ttl:
+            if self._health_lock.acquire(blocking=self._health is None):
+                try:
+                    if self._health is None or time.monotonic() - self._health_checked >= self.health_ttl:
+                        self._ping()
+                finally:
+                    self._health_lock.release()
+        return dict(self._health, checked_seconds_ago=round(time.monotonic() - self._health_checked, 1))
+
+    def _ping(self):
+        t0 = time.perf_counter()
+        try:
+            self.client.admin.command('ping')
+            self._health = {"ok": True, "latency_ms": (time.perf_counter() - t0) * 1000, "error": None}
+        except (DatabaseUnavailable, PyMongoError) as e:
+            self._health = {"ok": False, "latency_ms": None, "error": str(e)}
+        self._health_checked = time.monotonic()
@@ -0,0 +1,215 @@
+# **********************************************
+# * LabMonitor - Backend metrics (Prometheus)
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""In-process counters and histograms, rendered in the Prometheus text
+format by /metrics. The collector runs as one mod_wsgi daemon process with
+several threads, so a lock-protected registry in that process sees every
+request; no client library or multiprocess setup is needed.
+
+MetricsMiddleware times every request and counts request and response
+bytes; MongoCommandTimer times every MongoDB command. Both log anything
+slower than their threshold (0 disables the log).
+"""
+
+import time
+import json
+import threading
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=""):
+    parts = [f'{n}="{escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class MetricsRegistry:
+    """Named counters and histograms with labels, plus gauge callbacks
+    evaluated at scrape time."""
+
+    def __init__(self, prefix="labmonitor"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._meta = {}          # name -> (type, help, label names, buckets)
+        self._values = {}        # name -> {label values: value or [bucket counts, sum, count]}
+        self._gauges = []        # callables returning [(name, help, label names, {labels: value})]
+
+    def counter(self, name, help_text, labels=()):
+        self._meta[name] = ("counter", help_text, tuple(labels), None)
+        self._values[name] = {}
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self._meta[name] = ("histogram", help_text, tuple(labels), tuple(buckets))
+        self._values[name] = {}
+
+    def add_gauges(self, callback):
+        self._gauges.append(callback)
+
+    def inc(self, name, labels=(), n=1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + n
+
+    def observe(self, name, labels, value):
+        buckets = self._meta[name][3]
+        with self._lock:
+            series = self._values[name]
+            h = series.get(labels)
+            if h is None:
+                h = series[labels] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, label_names, buckets) in self._meta.items():
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} {kind}")
+                for labels, value in sorted(self._values[name].items()):
+                    if kind == "counter":
+                        lines.append(f"{full}{format_labels(label_names, labels)} {value}")
+                        continue
+                    counts, total, count = value
+                    for bound, c in zip(buckets, counts):
+                        le = f'le="{bound}"'
+                        lines.append(f"{full}_bucket{format_labels(label_names, labels, le)} {c}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{full}_bucket{format_labels(label_names, labels, le)} {count}")
+                    lines.append(f"{full}_sum{format_labels(label_names, labels)} {total}")
+                    lines.append(f"{full}_count{format_labels(label_names, labels)} {count}")
+        for callback in self._gauges:
+            try:
+                gauges = callback()
+            except Exception as e:
+                print(f"[ERROR] Metrics gauge callback failed: {e}")
+                continue
+            for name, help_text, label_names, series in gauges:
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} gauge")
+                for labels, value in sorted(series.items()):
+                    if value is not None:
+                        lines.append(f"{full}{format_labels(label_names, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+class CountingIterable:
+    """Passes a WSGI response body through, counting its bytes, and calls
+    on_close(bytes) when the server closes it."""
+
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+        self.bytes = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._on_close(self.bytes)
+
+class MetricsMiddleware:
+    """WSGI middleware: latency (until the response headers are sent, so a
+    long-lived /stream counts the time to open it), status, request and
+    response bytes per route. The route is the Flask URL rule, stored in
+    environ['labmonitor.route'] by the application."""
+
+    def __init__(self, wsgi_app, registry, slow_ms):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+        self.slow_ms = slow_ms
+        registry.histogram("http_request_duration_seconds", "Time to produce the response headers.", ("route", "method"))
+        registry.counter("http_requests_total", "Requests served.", ("route", "method", "status"))
+        registry.counter("http_request_bytes_total", "Request body bytes received.", ("route",))
+        registry.counter("http_response_bytes_total", "Response body bytes sent (after compression).", ("route",))
+
+    def __call__(self, environ, start_response):
+        t0 = time.perf_counter()
+        method = environ.get("REQUEST_METHOD", "")
+
+        def timed_start_response(status, headers, exc_info=None):
+            elapsed = time.perf_counter() - t0
+            route = environ.get("labmonitor.route", "unmatched")
+            self.registry.observe("http_request_duration_seconds", (route, method), elapsed)
+            self.registry.inc("http_requests_total", (route, method, status.split(" ", 1)[0]))
+            if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+                query = environ.get("QUERY_STRING", "")
+                print(f"[SLOW REQUEST] {method} {route}{'?' + query if query else ''} {elapsed * 1000:.0f} ms")
+            return start_response(status, headers, exc_info)
+
+        try:
+            request_bytes = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            request_bytes = 0
+
+        def on_close(response_bytes):
+            route = environ.get("labmonitor.route", "unmatched")
+            self.registry.inc("http_request_bytes_total", (route,), request_bytes)
+            self.registry.inc("http_response_bytes_total", (route,), response_bytes)
+
+        return CountingIterable(self.wsgi_app(environ, timed_start_response), on_close)
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo listener: duration of every command by command name and
+    collection, failures, and a log line for commands slower than slow_ms
+    (with the filter or pipeline that caused it)."""
+
+    def __init__(self, registry, slow_ms):
+        self.registry = registry
+        self.slow_ms = slow_ms
+        self._pending = {}
+        self._lock = threading.Lock()
+        registry.histogram("mongo_command_duration_seconds", "MongoDB command round trip.", ("command", "collection"))
+        registry.counter("mongo_command_failures_total", "MongoDB commands that failed.", ("command", "collection"))
+
+    def started(self, event):
+        # Hot path: keep a reference, build the log detail only if slow
+        name = event.command_name
+        target = event.command.get(name)
+        coll = target if isinstance(target, str) else event.command.get("collection", "")
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (coll, event.command if self.slow_ms else None)
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), ("", None))
+
+    def _log_if_slow(self, event, coll, command, seconds, outcome=""):
+        if not self.slow_ms or seconds * 1000 < self.slow_ms:
+            return
+        detail = ""
+        for key in ("filter", "pipeline", "q", "updates", "deletes"):
+            if command and key in command:
+                detail = json.dumps(command[key], default=str)[:500]
+                break
+        print(f"[SLOW QUERY] {event.command_name} {coll} {seconds * 1000:.0f} ms {outcome}{detail}")
+
+    def succeeded(self, event):
+        coll, command = self._finish(event)
+        seconds = event.duration_micros / 1e6
+        self.registry.observe("mongo_command_duration_seconds", (event.command_name, coll), seconds)
+        self._log_if_slow(event, coll, command, seconds)
+
+    def failed(self, event):
+        coll, command = self._finish(event)
+        seconds = event.duration_micros / 1e6
+        self.registry.observe("mongo_command_duration_seconds", (event.command_name, coll), seconds)
+        self.registry.inc("mongo_command_failures_total", (event.command_name, coll))
+        self._log_if_slow(event, coll, command, seconds, "(failed) ")
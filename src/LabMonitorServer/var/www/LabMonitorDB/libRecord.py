@@ -0,0 +1,143 @@
+# **********************************************
+# * LabMonitor - Compact binary sample records
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Binary form of the submit-sensor-data body (Content-Type:
+application/octet-stream), as sent by the Pico with
+submit_transport = "binary". Little-endian throughout:
+
+    envelope   "LM", format version (u8), record count (u16), then
+               device_name, user_comment, version, libSensors_version, ip,
+               each as a length (u8) and UTF-8 bytes
+    record v1  format version (u8)
+               presence bitmap (u16): bit 4*(s-1)+c for sensor s, channel c
+               UTC (i64, ns)
+               sensor type codes (3 x u8, see SENSOR_TYPES)
+               sens1..3 Temp, RH, P, HI (12 x float32, NaN when absent)
+
+A record is 62 bytes against ~700 for the JSON body. The key travels in
+the Authorization header instead of every sample.
+
+decode_body turns a body back into payload dicts shaped like the JSON
+ones (so split_sample and normalize_sample apply unchanged), decoding all
+records at once with NumPy when it is installed.
+"""
+
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"LM"
+FORMAT_VERSION = 1
+ENVELOPE = struct.Struct("<2sBH")
+RECORD = struct.Struct("<BHq3B12f")
+ENVELOPE_FIELDS = ("device_name", "user_comment", "version", "libSensors_version", "ip")
+CHANNELS = tuple(f"sens{s}_{c}" for s in (1, 2, 3) for c in ("Temp", "RH", "P", "HI"))
+# Must match SENSOR_TYPE_CODES in the Pico's code.py
+SENSOR_TYPES = {1: "sensor", 2: "CPU raw", 3: "CPU adj", 4: "CPU adj."}
+SENSOR_TYPE_CODES = {v: k for k, v in SENSOR_TYPES.items()}
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ("version", "u1"), ("present", "<u2"), ("UTC", "<i8"),
+        ("types", "u1", (3,)), ("values", "<f4", (len(CHANNELS),)),
+    ])
+    assert RECORD_DTYPE.itemsize == RECORD.size
+
+class RecordError(ValueError):
+    """Malformed or unsupported binary body."""
+
+def decode_envelope(body):
+    """Returns (envelope fields, offset of the first record, record count)."""
+    if len(body) < ENVELOPE.size:
+        raise RecordError("body shorter than the envelope")
+    magic, version, count = ENVELOPE.unpack_from(body)
+    if magic != MAGIC:
+        raise RecordError("not a LabMonitor binary body")
+    if version != FORMAT_VERSION:
+        raise RecordError(f"unsupported format version {version}")
+    offset = ENVELOPE.size
+    fields = {}
+    for name in ENVELOPE_FIELDS:
+        if offset >= len(body):
+            raise RecordError("truncated envelope")
+        n = body[offset]
+        fields[name] = bytes(body[offset + 1:offset + 1 + n]).decode("utf-8", errors="replace")
+        offset += 1 + n
+    if len(body) - offset != count * RECORD.size:
+        raise RecordError(f"expected {count} records of {RECORD.size} bytes after the envelope")
+    return fields, offset, count
+
+def decimal_float32(values):
+    """float32 readings as the decimals the Pico sent: 45.3 comes back as
+    45.3, not 45.29999923706055 (float32 holds 7 significant digits)."""
+    v = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(v)))
+    scale = 10.0 ** (6 - np.where(np.isfinite(magnitude), magnitude, 0))
+    return np.round(v * scale) / scale
+
+def _columns_numpy(body, offset, count):
+    records = np.frombuffer(body, RECORD_DTYPE, count, offset)
+    if (records["version"] != FORMAT_VERSION).any():
+        raise RecordError("unsupported record version")
+    present = (records["present"][:, None] >> np.arange(len(CHANNELS), dtype=np.uint16)) & 1
+    return (records["UTC"].tolist(), records["types"].tolist(),
+            decimal_float32(records["values"]).tolist(), present.astype(bool).tolist())
+
+def _columns_struct(body, offset, count):
+    utc, types, values, present = [], [], [], []
+    for rec in struct.iter_unpack(RECORD.format, body[offset:offset + count * RECORD.size]):
+        if rec[0] != FORMAT_VERSION:
+            raise RecordError("unsupported record version")
+        utc.append(rec[2])
+        types.append(rec[3:6])
+        values.append([float(f"{v:.7g}") for v in rec[6:]])
+        present.append([bool(rec[1] >> i & 1) for i in range(len(CHANNELS))])
+    return utc, types, values, present
+
+def decode_body(body):
+    """Payload dicts, one per record, with the envelope fields copied into
+    each. Channels whose presence bit is clear are left out."""
+    fields, offset, count = decode_envelope(body)
+    decode = _columns_numpy if np is not None else _columns_struct
+    utc, types, values, present = decode(body, offset, count)
+    samples = []
+    for i in range(count):
+        sample = dict(fields)
+        sample["UTC"] = utc[i]
+        for s in range(3):
+            sample[f"sens{s + 1}_type"] = SENSOR_TYPES.get(types[i][s])
+        row, mask = values[i], present[i]
+        for j, name in enumerate(CHANNELS):
+            if mask[j]:
+                sample[name] = row[j]
+        samples.append(sample)
+    return samples
+
+def encode_body(samples):
+    """Inverse of decode_body for JSON-shaped payloads (envelope fields
+    from the first one). Used by bench_fleet.py; the Pico has its own
+    dict-free encoder."""
+    parts = [ENVELOPE.pack(MAGIC, FORMAT_VERSION, len(samples))]
+    for name in ENVELOPE_FIELDS:
+        raw = str(samples[0].get(name) or "").encode("utf-8")[:255]
+        parts.append(bytes([len(raw)]) + raw)
+    for sample in samples:
+        present = 0
+        values = []
+        for j, name in enumerate(CHANNELS):
+            try:
+                value = float(sample.get(name))
+                present |= 1 << j
+            except (TypeError, ValueError):
+                value = float("nan")
+            values.append(value)
+        types = [SENSOR_TYPE_CODES.get(sample.get(f"sens{s}_type"), 0) for s in (1, 2, 3)]
+        parts.append(RECORD.pack(FORMAT_VERSION, present, int(sample.get("UTC") or 0), *types, *values))
+    return b"".join(parts)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - Lean schema migration
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Rewrites existing samples to the lean schema used by the collector:
+transport and auth fields (mongo_url, mongo_secret_key,
+is_pico_submit_mongo) are removed, and the static device metadata (ip,
+version, libSensors_version) is moved into the devices registry.
+
+Usage:
+    python3 migrate_lean_schema.py [--config config.cfg] [--batch-size 1000]
+                                   [--dry-run] [--compact]
+
+Documents are processed in _id order, in batches, so the script can be
+stopped and restarted at any time. Storage and index sizes are reported
+before and after. MongoDB only returns freed space to the OS after a
+compact, hence --compact.
+"""
+
+import os
+import sys
+import time
+import argparse
+from pymongo import MongoClient
+
+from libCollector import load_config, TRANSPORT_FIELDS, METADATA_FIELDS
+
+STRIPPED_FIELDS = TRANSPORT_FIELDS + METADATA_FIELDS
+
+def collection_stats(db, name):
+    s = db.command("collStats", name)
+    return {
+        "count": s.get("count", 0),
+        "size": s.get("size", 0),
+        "avgObjSize": s.get("avgObjSize", 0),
+        "storageSize": s.get("storageSize", 0),
+        "totalIndexSize": s.get("totalIndexSize", 0),
+    }
+
+def print_stats(before, after):
+    print(f"{'':16}{'before':>16}{'after':>16}{'change':>10}")
+    for key in before:
+        b, a = before[key], after[key]
+        change = f"{(a - b) / b * 100:+.1f}%" if b else "--"
+        print(f"{key:16}{b:>16,}{a:>16,}{change:>10}")
+
+def copy_metadata_to_registry(samples, devices):
+    """Fills in registry metadata from the latest sample that still has it.
+    Values already in the registry (written by the collector since the
+    upgrade) are newer and are kept."""
+    pipeline = [
+        {"$match": {"device_name": {"$ne": None}, "version": {"$exists": True}}},
+        {"$sort": {"datetime_utc_pico": 1}},
+        {"$group": {"_id": "$device_name", **{f: {"$last": f"${f}"} for f in METADATA_FIELDS}}},
+    ]
+    n = 0
+    for d in samples.aggregate(pipeline, allowDiskUse=True):
+        devices.update_one(
+            {"_id": d["_id"]},
+            [{"$set": {f: {"$ifNull": [f"${f}", d.get(f)]} for f in METADATA_FIELDS}}],
+            upsert=True,
+        )
+        n += 1
+    print(f"Registry metadata checked for {n} devices.")
+
+def strip_samples(samples, batch_size, dry_run):
+    """Unsets the stripped fields, one _id-ordered batch at a time."""
+    query = {"$or": [{f: {"$exists": True}} for f in STRIPPED_FIELDS]}
+    unset = {f: "" for f in STRIPPED_FIELDS}
+    last_id = None
+    total = 0
+    t0 = time.monotonic()
+    while True:
+        batch_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        ids = [d["_id"] for d in samples.find(batch_query, {"_id": 1}).sort("_id", 1).limit(batch_size)]
+        if not ids:
+            break
+        if not dry_run:
+            samples.update_many({"_id": {"$in": ids}}, {"$unset": unset})
+        last_id = ids[-1]
+        total += len(ids)
+        rate = total / max(time.monotonic() - t0, 1e-6)
+        print(f"  {total:,} documents {'found' if dry_run else 'rewritten'} ({rate:,.0f}/s), last _id {last_id}")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate LabMonitor samples to the lean schema.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count documents to rewrite, change nothing")
+    parser.add_argument("--compact", action="store_true", help="run compact afterwards to release disk space")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    client = MongoClient(config.get('MONGO_AUTH_STRING'), serverSelectionTimeoutMS=5000)
+    db = client[config.get('DATABASE_NAME')]
+    collection_name = config.get('COLLECTION_NAME')
+    samples = db[collection_name]
+    devices = db[config.get('DEVICES_COLLECTION_NAME', 'devices')]
+
+    before = collection_stats(db, collection_name)
+
+    if not args.dry_run:
+        copy_metadata_to_registry(samples, devices)
+    total = strip_samples(samples, args.batch_size, args.dry_run)
+    print(f"Done: {total:,} documents {'to rewrite' if args.dry_run else 'rewritten'}.")
+
+    if args.compact and not args.dry_run:
+        print("Running compact...")
+        db.command("compact", collection_name)
+
+    after = collection_stats(db, collection_name)
+    print_stats(before, after)
+    if not args.compact:
+        print("Note: storageSize only shrinks after 'compact' (use --compact).")
+
+if __name__ == "__main__":
+    sys.exit(main())
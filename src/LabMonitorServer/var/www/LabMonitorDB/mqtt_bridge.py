@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# **********************************************
+# * LabMonitor - MQTT to MongoDB bridge
+# * v2026.10.19.1
+# * By: Nicola Ferralis <feranick@hotmail.com>
+# **********************************************
+
+"""Stores readings that Picos publish over MQTT (submit_transport = "mqtt"
+in settings.toml) in the same collection as submit-sensor-data.
+
+Subscribes to MQTT_TOPIC_PREFIX/+ with QoS 1 and a persistent session.
+The device name is taken from the topic (the broker ACL only lets a device
+publish to its own topic), and each reading goes through the same split
+and normalization as submit-sensor-data, and is written by the same
+BulkWriter: one unordered insert_many per MQTT_BATCH_SIZE readings or
+MQTT_FLUSH_SECONDS, plus one devices-registry upsert per device. Readings
+already stored (unique device_name/UTC index) are counted as duplicates.
+
+Messages are acknowledged only after their readings are flushed (manual
+acks, paho-mqtt 2.0 or later). While MongoDB is down the queue fills up and
+the bridge stops reading from the broker, which keeps the remaining
+messages for the persistent session; a batch that still fails is left
+unacknowledged and redelivered by the broker when the bridge reconnects.
+The broker only sends as many unacknowledged messages as its in-flight
+limit (Mosquitto: max_inflight_messages, 20 by default), so raise it to at
+least MQTT_BATCH_SIZE.
+
+--self-test publishes one reading through the broker and waits for it to
+appear in MongoDB (the bridge must be running), then removes it.
+
+Usage:
+    python3 mqtt_bridge.py [--config config.cfg]
+    python3 mqtt_bridge.py --self-test [--config config.cfg] [--device bridge-selftest]
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import datetime
+import threading
+import collections
+import paho.mqtt.client as mqtt
+from bson import ObjectId
+
+from libCollector import load_config, split_sample, normalize_sample, BulkWriter
+from libDatabase import Database, client_options
+
+def parse_message(topic, payload, prefix, received_at):
+    """(sample, metadata) pairs from one message: a reading object or an
+    array of them, published to <prefix>/<device_name>."""
+    device = topic[len(prefix) + 1:]
+    if not topic.startswith(prefix + "/") or not device or "/" in device:
+        raise ValueError(f"unexpected topic {topic}")
+    data = json.loads(payload)
+    readings = data if isinstance(data, list) else [data]
+    entries = []
+    for reading in readings:
+        if not isinstance(reading, dict):
+            raise ValueError("expected a reading object or an array of them")
+        sample, meta = split_sample(reading)
+        sample["device_name"] = device
+        normalize_sample(sample, received_at)
+        sample["_id"] = ObjectId()
+        entries.append((sample, meta))
+    return entries
+
+def mqtt_client(config, client_id, clean_session):
+    """paho-mqtt client (1.x or 2.x) with credentials and TLS from config.cfg."""
+    kwargs = {"client_id": client_id, "clean_session": clean_session}
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        kwargs["callback_api_version"] = mqtt.CallbackAPIVersion.VERSION2
+    client = mqtt.Client(**kwargs)
+    if config.get('MQTT_USERNAME'):
+        client.username_pw_set(config.get('MQTT_USERNAME'), config.get('MQTT_PASSWORD'))
+    if config.get('MQTT_TLS_CA'):
+        client.tls_set(ca_certs=config.get('MQTT_TLS_CA'))
+    client.reconnect_delay_set(1, 30)
+    return client
+
+class Bridge:
+    """MQTT callbacks feeding a BulkWriter (libCollector), the same writer
+    submit-sensor-data uses. A message is acknowledged to the broker only
+    once every reading it carries has been flushed, so readings from a
+    failed batch are redelivered instead of lost."""
+
+    def __init__(self, database, prefix, queue_size, batch_size, flush_seconds, reconnect_max_seconds=30.0):
+        self.prefix = prefix
+        self.client = None
+        self.writer = BulkWriter(database, queue_size, batch_size, flush_seconds, reconnect_max_seconds, "bridge-writer")
+        self.writer.settled_listeners.append(self._settled)
+        self.stats = collections.Counter()
+        self._pending = {}      # sample _id -> [message id, QoS, readings not yet settled]
+        self._lock = threading.Lock()
+
+    def start(self, client):
+        """Starts writing; messages are acknowledged through client."""
+        self.client = client
+        if hasattr(client, "manual_ack_set"):
+            client.manual_ack_set(True)
+        else:
+            print("[WARNING] paho-mqtt < 2.0: messages are acknowledged on receipt, before they are stored.")
+        self.writer.start()
+
+    def stop(self, timeout=30):
+        """Stops the writer after flushing everything still queued."""
+        self.writer.stop(timeout)
+
+    def on_connect(self, client, userdata, flags, reason, *args):
+        print(f"[INFO] Connected to the MQTT broker ({reason}), subscribing to {self.prefix}/+")
+        client.subscribe(f"{self.prefix}/+", qos=1)
+
+    def on_message(self, client, userdata, message):
+        try:
+            entries = parse_message(message.topic, message.payload, self.prefix, datetime.datetime.utcnow())
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"[ERROR] Dropping message on {message.topic}: {e}")
+            self.stats["invalid"] += 1
+            self._ack(message.mid, message.qos)
+            return
+        if not entries:
+            self._ack(message.mid, message.qos)
+            return
+        pending = [message.mid, message.qos, len(entries)]
+        with self._lock:
+            for sample, _ in entries:
+                self._pending[sample["_id"]] = pending
+        for sample, meta in entries:
+            # Blocks the network loop when full: the broker holds the rest
+            self.writer.submit(sample, meta, block=True)
+        self.stats["received"] += len(entries)
+
+    def _settled(self, docs):
+        done = []
+        with self._lock:
+            for doc in docs:
+                pending = self._pending.pop(doc["_id"], None)
+                if pending is None:
+                    continue
+                pending[2] -= 1
+                if pending[2] == 0:
+                    done.append(pending)
+        for mid, qos, _ in done:
+            self._ack(mid, qos)
+
+    def _ack(self, mid, qos):
+        if qos and hasattr(self.client, "manual_ack_set"):
+            self.client.ack(mid, qos)
+
+def self_test(config, database, prefix, device):
+    """Publishes one reading and waits for the bridge to store it."""
+    utc = time.time_ns()
+    reading = {"sens1_Temp": "21.5", "sens1_type": "selftest", "UTC": utc, "version": "selftest"}
+    client = mqtt_client(config, f"{device}-publisher", True)
+    client.connect(config.get('MQTT_HOST', 'localhost'), config.getint('MQTT_PORT', 1883))
+    client.loop_start()
+    t0 = time.monotonic()
+    client.publish(f"{prefix}/{device}", json.dumps(reading), qos=1).wait_for_publish()
+    client.loop_stop()
+    client.disconnect()
+
+    query = {"device_name": device, "UTC": utc}
+    try:
+        while time.monotonic() - t0 < 15:
+            if database.samples.find_one(query, {"_id": 1}):
+                print(f"OK: reading stored {(time.monotonic() - t0) * 1000:.0f} ms after publishing.")
+                return 0
+            time.sleep(0.1)
+        print("FAILED: reading not stored after 15 s. Is mqtt_bridge.py running?")
+        return 1
+    finally:
+        time.sleep(1)   # let the registry upsert of the same batch land first
+        database.samples.delete_many({"device_name": device})
+        database.devices.delete_one({"_id": device})
+
+def main():
+    parser = argparse.ArgumentParser(description="Bridge LabMonitor MQTT readings into MongoDB.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg"))
+    parser.add_argument("--self-test", action="store_true", help="publish one reading and check that it is stored")
+    parser.add_argument("--device", default="bridge-selftest", help="device name used by --self-test")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    database = Database(config.get('MONGO_AUTH_STRING'), config.get('DATABASE_NAME'), config.get('COLLECTION_NAME'),
+                        config.get('DEVICES_COLLECTION_NAME', 'devices'), client_options(config),
+                        config.getfloat('MONGO_RECONNECT_MAX_SECONDS', 30.0))
+    prefix = config.get('MQTT_TOPIC_PREFIX', 'labmonitor')
+
+    if args.self_test:
+        return self_test(config, database, prefix, args.device)
+
+    bridge = Bridge(database, prefix, config.getint('MQTT_QUEUE_SIZE', 10000),
+                    config.getint('MQTT_BATCH_SIZE', 500), config.getfloat('MQTT_FLUSH_SECONDS', 1.0),
+                    config.getfloat('MONGO_RECONNECT_MAX_SECONDS', 30.0))
+    client = mqtt_client(config, config.get('MQTT_CLIENT_ID', 'labmonitor-bridge'), False)
+    client.on_connect = bridge.on_connect
+    client.on_message = bridge.on_message
+    bridge.start(client)
+    # connect_async: the network loop keeps retrying until the broker is up
+    client.connect_async(config.get('MQTT_HOST', 'localhost'), config.getint('MQTT_PORT', 1883), keepalive=60)
+    client.loop_start()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    while not stop.wait(60):
+        print(f"[INFO] {dict(bridge.stats)}, {bridge.writer.snapshot()}")
+
+    client.disconnect()
+    client.loop_stop()
+    bridge.stop()
+    print(f"[INFO] Bridge stopped: {dict(bridge.stats)}, {bridge.writer.snapshot()}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-let version = "2026.08.06.1";
+let version = "2026.10.19.4";
 
 const NO_COMMENT_TOKEN = "NO COMMENT";
 let sensorChart;
@@ -7,6 +7,17 @@ let nameSelIndex="LabMonitorViewer_device_dropdown";
 let timeSelectedValue = 1;
 let timeSelectedIndex = 0;   // must correspond to timeSelectedValue's option
 
+// Live mode: poll /get-data?since= and append only what is new.
+const LIVE_REFRESH_MS = 30000;
+let liveTimer = null;
+let liveCursor = null;       // id of the newest document held
+let liveDevice = "All";      // device filter of the last fetch
+let liveWindowMs = 0;        // span of the last fetch; older points get trimmed
+// The server re-sends the last few seconds of ids behind the cursor (late
+// commits), so ids already held are remembered and skipped for a while.
+const LIVE_SEEN_TTL_MS = 600000;
+const liveSeenIds = new Map(); // id -> time received (ms)
+
 // This object will store ALL data points, just like before.
 const chartDataStore = {
     labels: [],      // Array of Date objects (for the chart)
@@ -127,7 +138,9 @@ async function fetchAndDisplayData() {
     const startDate = new Date(startInput + 'Z').toISOString();
     const endDate = new Date(endInput + 'Z').toISOString();
     
-    var API_ENDPOINT = `/LabMonitorDB/api/get-data?start=${startDate}&end=${endDate}`;
+    // Columnar format: one array per field, numbers already parsed and
+    // timestamps in epoch ms, so there are no per-row key names to download.
+    var API_ENDPOINT = `/LabMonitorDB/api/get-data?start=${startDate}&end=${endDate}&format=columnar`;
     
     const devDropdown = document.getElementById('deviceDropdown');
     const devSelectedValue = devDropdown.value;
@@ -137,7 +150,7 @@ async function fetchAndDisplayData() {
     console.log("Display time Period - fetchAndDisplayData: "+ timeSelectedValue);
     
     if (devSelectedValue != "All") {
-        API_ENDPOINT += `&device_name=${devSelectedValue}`;
+        API_ENDPOINT += `&device_name=${encodeURIComponent(devSelectedValue)}`;
         }
             
     console.log(`Fetching data from: ${API_ENDPOINT}`);
@@ -150,47 +163,25 @@ async function fetchAndDisplayData() {
             throw new Error(err.message || `Server responded with ${response.status}`);
         }
         
-        const dataArray = await response.json();
-        console.log(`Received ${dataArray.length} data points.`);
+        const cols = await response.json();
+        console.log(`Received ${cols.count} data points.`);
 
         // 1. Clear existing plot data
         clearPlot();
 
-        // 2. Loop through new data and populate the store
-        dataArray.forEach(point => {
-            //const timestamp = new Date(point.datetime_utc_pico);
-            const timestamp = new Date(Math.round(point.UTC / 1e6));
-            const s1_WBT_string = getWebBulbTemp(point.sens1_Temp, point.sens1_RH, point.sens1_type);
-
-            chartDataStore.labels.push(timestamp);
-            // Derive the ISO label from UTC so CSV timestamps and export
-            // filenames are always valid regardless of stored field names.
-            chartDataStore.isoLabels.push(timestamp.toISOString());
-            chartDataStore.sens1_Temp.push(toNumberOrNull(point.sens1_Temp));
-            chartDataStore.sens1_RH.push(toNumberOrNull(point.sens1_RH));
-            chartDataStore.sens1_HI.push(toNumberOrNull(point.sens1_HI));
-            chartDataStore.sens1_WBT.push(toNumberOrNull(s1_WBT_string));
-            chartDataStore.sens2_Temp.push(toNumberOrNull(point.sens2_Temp));
-            chartDataStore.sens2_RH.push(toNumberOrNull(point.sens2_RH));
-            chartDataStore.sens3_Temp.push(toNumberOrNull(point.sens3_Temp));
-            chartDataStore.sens3_RH.push(toNumberOrNull(point.sens3_RH));
-            chartDataStore.userComments.push(point.user_comment || "");
-        });
+        // 2. Populate the store straight from the columns
+        appendColumns(cols);
+        // An empty range has no newest id; continue from its end time instead.
+        liveCursor = cols.cursor || endDate;
+        liveDevice = devSelectedValue;
+        liveWindowMs = new Date(endDate) - new Date(startDate);
 
         // 3. Update the chart with all new data
         updateVisibleDatasets();
         
         // --- NEW: Explicitly Set X-Axis Bounds to Full Data Range ---
         if (chartDataStore.labels.length > 0) {
-            const firstTimestamp = chartDataStore.labels[0];
-            const lastTimestamp = chartDataStore.labels.at(-1);
-            
-            // Set the min/max bounds for the X-axis
-            sensorChart.options.scales.x.min = firstTimestamp;
-            sensorChart.options.scales.x.max = lastTimestamp;
-
-            // Force a chart update to apply the new bounds
-            sensorChart.update('none'); // 'none' is often faster for options change
+            setXBoundsToData();
 
             // Ensure zoom is reset to show the full defined range
             sensorChart.resetZoom();
@@ -206,6 +197,117 @@ async function fetchAndDisplayData() {
     }
 }
 
+// Appends a columnar /get-data response to the store, skipping ids already
+// held. Returns the number of points added.
+function appendColumns(cols) {
+    const now = Date.now();
+    const lastTime = chartDataStore.labels.length ? chartDataStore.labels.at(-1).getTime() : -Infinity;
+    let added = 0;
+    let outOfOrder = false;
+    for (let i = 0; i < cols.count; i++) {
+        const id = cols.id ? cols.id[i] : null;
+        if (id) {
+            if (liveSeenIds.has(id)) continue;
+            liveSeenIds.set(id, now);
+        }
+        const timestamp = new Date(cols.timestamps[i]);
+        if (timestamp.getTime() < lastTime) outOfOrder = true;
+        added++;
+        chartDataStore.labels.push(timestamp);
+        // Derive the ISO label from UTC so CSV timestamps and export
+        // filenames are always valid regardless of stored field names.
+        chartDataStore.isoLabels.push(timestamp.toISOString());
+        chartDataStore.sens1_Temp.push(cols.sens1_Temp[i]);
+        chartDataStore.sens1_RH.push(cols.sens1_RH[i]);
+        chartDataStore.sens1_HI.push(cols.sens1_HI[i]);
+        chartDataStore.sens1_WBT.push(toNumberOrNull(getWebBulbTemp(cols.sens1_Temp[i], cols.sens1_RH[i], cols.sens1_type[i])));
+        chartDataStore.sens2_Temp.push(cols.sens2_Temp[i]);
+        chartDataStore.sens2_RH.push(cols.sens2_RH[i]);
+        chartDataStore.sens3_Temp.push(cols.sens3_Temp[i]);
+        chartDataStore.sens3_RH.push(cols.sens3_RH[i]);
+        chartDataStore.userComments.push(cols.user_comment[i] || "");
+    }
+    // A late commit can be older than the newest point held
+    if (outOfOrder) sortStoreByTime();
+    return added;
+}
+
+// Reorders every array of the store by time.
+function sortStoreByTime() {
+    const order = chartDataStore.labels.map((d, i) => i)
+        .sort((a, b) => chartDataStore.labels[a] - chartDataStore.labels[b]);
+    Object.keys(chartDataStore).forEach(key => {
+        const values = chartDataStore[key];
+        chartDataStore[key] = order.map(i => values[i]);
+    });
+}
+
+// Forgets ids received long enough ago that the server no longer re-sends them.
+function pruneSeenIds() {
+    const oldest = Date.now() - LIVE_SEEN_TTL_MS;
+    for (const [id, received] of liveSeenIds) {
+        if (received >= oldest) break;
+        liveSeenIds.delete(id);
+    }
+}
+
+// Pins the x-axis to the first and last point held.
+function setXBoundsToData() {
+    sensorChart.options.scales.x.min = chartDataStore.labels[0];
+    sensorChart.options.scales.x.max = chartDataStore.labels.at(-1);
+    // Force a chart update to apply the new bounds
+    sensorChart.update('none'); // 'none' is often faster for options change
+}
+
+// --- Live mode: append new points instead of refetching the range ---
+async function fetchLiveUpdate() {
+    // Nothing fetched yet (or plot cleared): there is no cursor to continue from.
+    if (!liveCursor) return;
+
+    let url = `/LabMonitorDB/api/get-data?since=${liveCursor}&format=columnar`;
+    if (liveDevice != "All") {
+        url += `&device_name=${encodeURIComponent(liveDevice)}`;
+    }
+
+    try {
+        const response = await fetch(url);
+        if (!response.ok) {
+            const err = await response.json();
+            throw new Error(err.message || `Server responded with ${response.status}`);
+        }
+        const cols = await response.json();
+        if (cols.cursor) liveCursor = cols.cursor;
+        const added = appendColumns(cols);
+        pruneSeenIds();
+        if (added === 0) return;
+        console.log(`Live: appended ${added} data points.`);
+
+        trimToLiveWindow();
+        updateVisibleDatasets();
+        setXBoundsToData();
+    } catch (error) {
+        console.error('Live update failed:', error);
+    }
+}
+
+// Drops points older than the span originally fetched, so a page left in
+// live mode keeps a sliding window rather than growing without bound.
+function trimToLiveWindow() {
+    const n = chartDataStore.labels.length;
+    if (n === 0 || liveWindowMs <= 0) return;
+    const oldest = chartDataStore.labels[n - 1].getTime() - liveWindowMs;
+    let k = 0;
+    while (k < n && chartDataStore.labels[k].getTime() < oldest) k++;
+    if (k === 0) return;
+    Object.keys(chartDataStore).forEach(key => chartDataStore[key].splice(0, k));
+}
+
+function setLiveMode(enabled) {
+    clearInterval(liveTimer);
+    liveTimer = enabled ? setInterval(fetchLiveUpdate, LIVE_REFRESH_MS) : null;
+    console.log(`Live mode ${enabled ? 'on' : 'off'}.`);
+}
+
 // --- Get available devices that saved in database ---
 async function setDeviceNames() {
     const DISTINCT_DEVICES_API_ENDPOINT = `/LabMonitorDB/api/distinct-devices`;
@@ -291,6 +393,8 @@ function clearPlot() {
     // Was previously left populated, so the hover box showed stale comments
     // from the previous fetch after a Clear.
     chartDataStore.userComments = [];
+    liveCursor = null;
+    liveSeenIds.clear();
 
     // Drop the bounds pinned by the last fetch, otherwise the empty plot keeps
     // showing the old time range.
@@ -378,67 +482,23 @@ function exportToCsv() {
     }
     console.log(`Exporting ${range.end - range.start} of ${chartDataStore.isoLabels.length} points (${range.full ? 'full data' : 'visible range'}).`);
 
-    // Only carry a comment column when the exported range actually has one,
-    // so files from comment-free runs look exactly as they always did.
-    let hasComments = false;
-    for (let i = range.start; i < range.end; i++) {
-        if (normalizeComment(chartDataStore.userComments[i]) !== "") { hasComments = true; break; }
+    // The server streams the file straight from the database, so long ranges
+    // never have to be assembled in this tab. The rows are the ones between
+    // the first and last exported point (end is exclusive, hence +1 ms), with
+    // the same columns and change-only comment column this export always had.
+    const start = chartDataStore.isoLabels[range.start];
+    const end = new Date(chartDataStore.labels[range.end - 1].getTime() + 1).toISOString();
+    let url = `/LabMonitorDB/api/export?start=${start}&end=${end}&format=csv`;
+    if (liveDevice != "All") {
+        url += `&device_name=${encodeURIComponent(liveDevice)}`;
     }
 
-    const headers = ['timestamp', 'sens1_Temp', 'sens2_Temp', 'sens1_RH', 'sens1_WBT', 'sens1_HI', 'sens2_RH', 'sens3_Temp', 'sens3_RH'];
-    if (hasComments) headers.push('comment');
-    let csvContent = headers.join(',') + "\n";
-
-    // Change-only ("run length") encoding: the comment is written on the first
-    // exported row and thereafter only when it differs from the previous row.
-    // A reader forward-fills blanks, so a long constant comment costs one cell.
-    let previousComment = null;
-
-    for (let i = range.start; i < range.end; i++) {
-        const row = [
-            chartDataStore.isoLabels[i],
-            chartDataStore.sens1_Temp[i],
-            chartDataStore.sens2_Temp[i],
-            chartDataStore.sens1_RH[i],
-            chartDataStore.sens1_WBT[i],
-            chartDataStore.sens1_HI[i],
-            chartDataStore.sens2_RH[i],
-            chartDataStore.sens3_Temp[i],
-            chartDataStore.sens3_RH[i]
-        ];
-
-        if (hasComments) {
-            const current = normalizeComment(chartDataStore.userComments[i]);
-            // previousComment === null on the first exported row: the value is
-            // always written out, so a visible-range export still states the
-            // comment that was already running when the window opens.
-            row.push(encodeCommentCell(current, previousComment));
-            previousComment = current;
-        }
-
-        csvContent += row.map(csvCell).join(',') + "\n";
-    }
-
-    // A Blob URL avoids the length limit of a data: URI and needs no encoding,
-    // where encodeURI() would also have left a literal '#' truncating the file.
-    const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8' });
-    const url = URL.createObjectURL(blob);
     const link = document.createElement('a');
     link.href = url;
     link.download = safeFileName(chartDataStore.isoLabels[range.end - 1]) + '_sensor-data.csv';
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
-    setTimeout(() => URL.revokeObjectURL(url), 1000);
-}
-
-// Quotes a single CSV field. Numbers and nulls come through unchanged (null
-// becomes an empty cell, as it did when rows were plain-joined), while free
-// text is wrapped whenever it contains a separator, a quote or a newline.
-function csvCell(v) {
-    if (v === null || v === undefined) return '';
-    const s = String(v);
-    return /[",\r\n]/.test(s) ? '"' + s.replace(/"/g, '""') + '"' : s;
 }
 
 // A stored comment reduced to its meaning: the empty string means "no comment",
@@ -448,17 +508,6 @@ function normalizeComment(c) {
     return s.toUpperCase() === NO_COMMENT_TOKEN ? '' : s;
 }
 
-// The cell to write for `current`, given the comment written on the previous
-// exported row (null on the first row, which is always written explicitly).
-//   ""              -> nothing to say and nothing to cancel: blank
-//   same as before  -> blank, and the reader forward-fills
-//   newly empty     -> the sentinel, which cancels the run above
-function encodeCommentCell(current, previous) {
-    if (previous === null) return current;          // first exported row
-    if (current === previous) return '';            // unchanged: inherit
-    return current === '' ? NO_COMMENT_TOKEN : current;
-}
-
 // Colons are illegal in filenames on Windows and get rewritten elsewhere.
 function safeFileName(s) {
     return String(s || 'export').replace(/:/g, '-');
@@ -555,6 +604,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const zoomBtn = document.getElementById('zoomButton');
     const resetZoomBtn = document.getElementById('resetZoomButton'); 
     const fullDataCb = document.getElementById('fullDataCheckbox');
+    const liveCb = document.getElementById('liveCheckbox');
     const checkboxes = document.querySelectorAll('.data-checkbox');
     const deviceDropdown = document.getElementById('deviceDropdown');
     const timePeriodDropdown = document.getElementById('timePeriodDropdown');
@@ -649,6 +699,16 @@ document.addEventListener('DOMContentLoaded', () => {
         setCookie("fullDataExport", this.checked ? "1" : "0", 1000);
     });
 
+    // --- Live mode toggle (remembered between sessions) ---
+    if (cookieExists("liveMode")) {
+        liveCb.checked = getCookie("liveMode") === "1";
+    }
+    setLiveMode(liveCb.checked);
+    liveCb.addEventListener('change', function() {
+        setCookie("liveMode", this.checked ? "1" : "0", 1000);
+        setLiveMode(this.checked);
+    });
+
     checkboxes.forEach(cb => {
         cb.addEventListener('change', updateVisibleDatasets);
     });
@@ -2,11 +2,11 @@
 # **********************************************
 # * LabMonitor - settings.toml Editor
 # * Pico driven
-# * v2025.11.26.1
+# * v2026.10.19.1
 # * By: Nicola Ferralis <feranick@hotmail.com>
 # **********************************************
 
-version = "2025.12.12.1"
+version = "2026.10.19.1"
 
 import tkinter as tk
 from tkinter import messagebox, filedialog
@@ -62,7 +62,14 @@ DEFAULT_SETTINGS = {
     },
     'device': {
         'device_name': 'PicoTesting',
-        'is_pico_submit_mongo': True
+        'is_pico_submit_mongo': True,
+        'submit_transport': 'http'
+    },
+    'mqtt': {
+        'mqtt_broker': 'broker_address',
+        'mqtt_port': 8883,
+        'mqtt_username': 'PicoTesting',
+        'mqtt_password': 'mqtt_password'
     },
 }
 